@@ -0,0 +1,490 @@
+"""
+Local benchmarks for the bot's hot paths. No Telegram or LLM access needed.
+
+Usage:
+    python benchmark.py sessions --chats 50 --summarize-delay 2.0
+    python benchmark.py store --chats 3000 --messages 20
+    python benchmark.py startup
+    python benchmark.py llm-stub --port 8900 --ttft 0.3 --fail-rate 0.1
+    python benchmark.py router --requests 40 --slow-every 4
+    python benchmark.py updates --chats 1,10,50,200 --agent-time 0.5
+    python benchmark.py webhook --url http://127.0.0.1:8443/telegram --secret S --chats 20 --messages 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import types
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from core.sessions import ChatLocks, SessionStore
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def print_latencies(label, latencies):
+    print(
+        f"{label:<12} n={len(latencies):<5} "
+        f"p50={percentile(latencies, 50) * 1000:8.1f}ms "
+        f"p99={percentile(latencies, 99) * 1000:8.1f}ms "
+        f"max={max(latencies) * 1000:8.1f}ms "
+        f"mean={statistics.mean(latencies) * 1000:8.1f}ms"
+    )
+
+
+# --- sessions: global session lock vs per-chat locks ---
+
+async def _session_turn(lock, needs_summary, summarize_delay, write_delay):
+    """One message: read history, maybe summarize (LLM round-trip), write back."""
+    start = time.perf_counter()
+    async with lock:
+        if needs_summary:
+            await asyncio.sleep(summarize_delay)
+        time.sleep(write_delay)  # save_sessions() is a synchronous write
+    return time.perf_counter() - start
+
+
+async def _run_sessions(chats, summarize_every, summarize_delay, write_delay, per_chat):
+    global_lock = asyncio.Lock()
+    locks = ChatLocks()
+
+    turns = []
+    for i in range(chats):
+        lock = locks.get(i) if per_chat else global_lock
+        needs_summary = summarize_every > 0 and i % summarize_every == 0
+        turns.append(_session_turn(lock, needs_summary, summarize_delay, write_delay))
+    return await asyncio.gather(*turns)
+
+
+def bench_sessions(args):
+    print(
+        f"{args.chats} simultaneous chats, every {args.summarize_every}th summarizes "
+        f"({args.summarize_delay:.1f}s), write {args.write_delay * 1000:.1f}ms"
+    )
+    for label, per_chat in (("global lock", False), ("per-chat", True)):
+        latencies = asyncio.run(
+            _run_sessions(args.chats, args.summarize_every, args.summarize_delay, args.write_delay, per_chat)
+        )
+        print_latencies(label, latencies)
+
+
+# --- store: whole-file sessions.json rewrite vs per-chat SQLite row ---
+
+def _fake_history(messages):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": "Привет, Jarvis! " * 20}
+        for i in range(messages)
+    ]
+
+
+def bench_store(args):
+    sessions = {str(i): _fake_history(args.messages) for i in range(args.chats)}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "sessions.json")
+        latencies = []
+        for i in range(args.saves):
+            start = time.perf_counter()
+            with open(json_path, "w") as f:
+                json.dump(sessions, f)
+            latencies.append(time.perf_counter() - start)
+        size = os.path.getsize(json_path)
+        print(f"{args.chats} chats x {args.messages} messages, {size / 1024 / 1024:.1f} MB as JSON")
+        print_latencies("json file", latencies)
+
+        store = SessionStore(os.path.join(tmp, "sessions.db"), legacy_file=None)
+        for chat_id, history in sessions.items():
+            store.set(chat_id, history)
+
+        async def save_all():
+            result = []
+            for i in range(args.saves):
+                start = time.perf_counter()
+                await store.save(str(i % args.chats))
+                result.append(time.perf_counter() - start)
+            return result
+
+        print_latencies("sqlite row", asyncio.run(save_all()))
+        store.close()
+
+
+# --- startup: eager module import vs lazy manifest ---
+
+STARTUP_PROBE = (
+    "import json\n"
+    "from core.tools import ToolRegistry\n"
+    "registry = ToolRegistry()\n"
+    "registry.load_modules(lazy={lazy})\n"
+    "print('REPORT ' + json.dumps(registry.load_report))\n"
+)
+
+
+def bench_startup(args):
+    for lazy in (False, True):
+        for run in range(args.runs):
+            start = time.perf_counter()
+            proc = subprocess.run(
+                [sys.executable, "-c", STARTUP_PROBE.format(lazy=lazy)],
+                capture_output=True, text=True,
+            )
+            wall_ms = (time.perf_counter() - start) * 1000
+            reports = [line[7:] for line in proc.stdout.splitlines() if line.startswith("REPORT ")]
+            if not reports:
+                print(f"{'lazy' if lazy else 'eager'}: probe failed\n{proc.stderr[-2000:]}")
+                break
+            report = json.loads(reports[-1])
+            print(
+                f"{report['mode']:<6} run {run + 1}: load_modules {report['elapsed_ms']:7.0f} ms, "
+                f"process {wall_ms:7.0f} ms, RSS {report['rss_mb']:6.1f} MB, "
+                f"{report['tools']} tools, {report['deferred_modules']} modules deferred"
+            )
+
+
+# --- llm-stub / router: OpenAI-compatible stub server and the LLM router ---
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    """
+    Answers POST .../chat/completions like the OpenAI API, streaming or not.
+    Behaviour comes from the server: ttft (s), fail_rate, slow_every (every
+    Nth request waits slow_ttft before its first chunk).
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with server.lock:
+            server.requests += 1
+            n = server.requests
+
+        if random.random() < server.fail_rate:
+            payload = json.dumps({"error": {"message": "stub failure", "type": "server_error"}}).encode()
+            self.send_response(503)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        slow = server.slow_every and n % server.slow_every == 0
+        time.sleep(server.slow_ttft if slow else server.ttft)
+        model = body.get("model", "stub")
+        words = [f"{server.name}", "says", "hello"]
+
+        if not body.get("stream"):
+            payload = json.dumps({
+                "id": f"stub-{n}", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": " ".join(words)}}],
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for i, word in enumerate(words + [None]):
+                delta = {"content": word + " "} if word else {}
+                chunk = {
+                    "id": f"stub-{n}", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": None if word else "stop"}],
+                }
+                self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+                time.sleep(server.chunk_delay)
+            if (body.get("stream_options") or {}).get("include_usage"):
+                usage = {"prompt_tokens": 20, "completion_tokens": len(words), "total_tokens": 20 + len(words)}
+                chunk = {"id": f"stub-{n}", "object": "chat.completion.chunk", "created": int(time.time()),
+                         "model": model, "choices": [], "usage": usage}
+                self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The router closed a losing hedge
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+def start_stub(name, port=0, ttft=0.05, fail_rate=0.0, slow_every=0, slow_ttft=3.0, chunk_delay=0.01):
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubLLMHandler)
+    server.daemon_threads = True
+    server.name = name
+    server.ttft, server.fail_rate = ttft, fail_rate
+    server.slow_every, server.slow_ttft = slow_every, slow_ttft
+    server.chunk_delay = chunk_delay
+    server.requests = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def bench_llm_stub(args):
+    server, url = start_stub("stub", args.port, args.ttft, args.fail_rate, args.slow_every, args.slow_ttft)
+    print(f"OpenAI-compatible stub on {url} (set DEEPSEEK_BASE_URL / GROQ_BASE_URL to it). Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+async def _run_router(llm, requests):
+    latencies = []
+    winners = {}
+    for _ in range(requests):
+        start = time.perf_counter()
+        stream = await llm.generate([{"role": "user", "content": "hi"}], provider="deepseek", model="default", stream=True)
+        first = None
+        async for chunk in stream:
+            if isinstance(chunk, str):
+                first = chunk
+                break
+            if first is None:
+                latencies.append(time.perf_counter() - start)
+                first = chunk.choices[0].delta.content or ""
+        winners[first.strip()] = winners.get(first.strip(), 0) + 1
+    return latencies, winners
+
+
+def bench_router(args):
+    import config
+    _, primary_url = start_stub("deepseek", ttft=args.ttft, fail_rate=args.fail_rate,
+                                slow_every=args.slow_every, slow_ttft=args.slow_ttft)
+    _, fallback_url = start_stub("groq", ttft=args.ttft * 2)
+    config.DEEPSEEK_BASE_URL = primary_url
+    config.GROQ_BASE_URL = fallback_url
+    config.DEEPSEEK_API_KEY = config.GROQ_API_KEY = "stub"
+    config.LLM_HEDGE_DELAY = args.hedge_delay
+
+    from core.llm import LLMService
+    llm = LLMService()
+    print(
+        f"{args.requests} streams; primary ttft {args.ttft * 1000:.0f}ms, every {args.slow_every}th "
+        f"waits {args.slow_ttft:.1f}s, fail rate {args.fail_rate:.0%}; hedge after {args.hedge_delay}s"
+    )
+    latencies, winners = asyncio.run(_run_router(llm, args.requests))
+    if latencies:
+        print_latencies("first token", latencies)
+    print(f"answered by: {winners}")
+    print(json.dumps({
+        "router": llm.router_stats(), "scheduler": llm.scheduler_stats(), "connections": llm.connection_stats(),
+    }, indent=2, default=str))
+
+
+# --- updates: reply latency vs number of chats, serial handlers vs per-chat ordered processing ---
+
+async def _run_updates(chats, messages, agent_time, handler_time, max_runs, workers, concurrent):
+    """
+    Every chat sends `messages` updates at once. A handler does `handler_time`
+    of work (download, history write), then an agent turn of `agent_time`
+    (at most `max_runs` at a time). Latency = arrival to end of the turn.
+    """
+    from core.updates import ChatOrderedUpdateProcessor
+
+    latencies = []
+    handled = {}  # chat -> message numbers in the order their handlers ran
+    runs = []
+    run_slots = asyncio.Semaphore(max_runs)
+
+    async def agent_turn(arrived):
+        async with run_slots:
+            await asyncio.sleep(agent_time)
+        latencies.append(time.perf_counter() - arrived)
+
+    async def handler(chat, number, arrived):
+        await asyncio.sleep(handler_time)
+        handled.setdefault(chat, []).append(number)
+        if concurrent:
+            runs.append(asyncio.create_task(agent_turn(arrived)))  # start_agent_run()
+        else:
+            await agent_turn(arrived)  # Old handlers awaited the turn
+
+    arrived = time.perf_counter()
+    updates = [(chat, number) for number in range(messages) for chat in range(chats)]
+    if concurrent:
+        processor = ChatOrderedUpdateProcessor(workers)
+        await asyncio.gather(*[
+            processor.process_update(
+                types.SimpleNamespace(effective_chat=types.SimpleNamespace(id=chat)),
+                handler(chat, number, arrived),
+            )
+            for chat, number in updates
+        ])
+        await asyncio.gather(*runs)
+    else:
+        for chat, number in updates:  # No concurrent_updates: one update at a time
+            await handler(chat, number, arrived)
+
+    in_order = all(numbers == sorted(numbers) for numbers in handled.values())
+    return latencies, in_order
+
+
+def bench_updates(args):
+    print(
+        f"agent turn {args.agent_time:.2f}s, handler {args.handler_time * 1000:.0f}ms, "
+        f"{args.messages} message(s) per chat, {args.max_runs} concurrent turns, {args.workers} update workers"
+    )
+    for chats in [int(n) for n in args.chats.split(",")]:
+        for concurrent in (False, True):
+            if not concurrent and chats * args.messages * args.agent_time > args.max_serial:
+                print(f"{chats:>4} chats serial    skipped (would take over {args.max_serial:.0f}s)")
+                continue
+            latencies, in_order = asyncio.run(_run_updates(
+                chats, args.messages, args.agent_time, args.handler_time, args.max_runs, args.workers, concurrent
+            ))
+            label = f"{chats} {'ordered' if concurrent else 'serial'}"
+            print_latencies(label, latencies)
+            if not in_order:
+                print("  !! per-chat order violated")
+
+
+# --- webhook: fake Telegram update poster ---
+
+def fake_text_update(update_id, chat_id, text):
+    """Minimal Update JSON for a private text message, as Telegram would POST it."""
+    user = {"id": chat_id, "is_bot": False, "first_name": f"Load{chat_id}"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": user["first_name"]},
+            "from": user,
+            "text": text,
+        },
+    }
+
+
+def _post_update(url, secret, update):
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(update).encode(),
+        headers={"Content-Type": "application/json", "X-Telegram-Bot-Api-Secret-Token": secret},
+        method="POST",
+    )
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception:
+        status = "error"
+    return status, time.perf_counter() - start
+
+
+def bench_webhook(args):
+    updates = []
+    update_id = args.first_update_id
+    for message in range(args.messages):
+        for chat in range(args.chats):
+            updates.append(fake_text_update(update_id, args.first_chat_id + chat, f"{args.text} #{message}"))
+            update_id += 1
+
+    print(f"POST {len(updates)} updates ({args.chats} chats x {args.messages}) to {args.url}, concurrency {args.concurrency}")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda u: _post_update(args.url, args.secret, u), updates))
+    elapsed = time.perf_counter() - start
+
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    print_latencies("accept", [latency for _, latency in results])
+    print(f"{len(updates) / elapsed:.1f} updates/s, HTTP status counts: {statuses}")
+    if args.secret:
+        status, _ = _post_update(args.url, args.secret + "-wrong", fake_text_update(update_id, args.first_chat_id, "x"))
+        print(f"wrong secret token -> HTTP {status} (expected 403)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("sessions", help="Chat latency with a global session lock vs per-chat locks")
+    p.add_argument("--chats", type=int, default=50)
+    p.add_argument("--summarize-every", type=int, default=5)
+    p.add_argument("--summarize-delay", type=float, default=2.0)
+    p.add_argument("--write-delay", type=float, default=0.002)
+    p.set_defaults(func=bench_sessions)
+
+    p = sub.add_parser("store", help="Cost of saving one chat: whole sessions.json vs SessionStore")
+    p.add_argument("--chats", type=int, default=3000)
+    p.add_argument("--messages", type=int, default=20)
+    p.add_argument("--saves", type=int, default=50)
+    p.set_defaults(func=bench_store)
+
+    p = sub.add_parser("startup", help="Startup time and RSS with eager vs lazy module loading")
+    p.add_argument("--runs", type=int, default=2, help="The first lazy run also builds the manifest")
+    p.set_defaults(func=bench_startup)
+
+    p = sub.add_parser("llm-stub", help="Run an OpenAI-compatible stub server for local LLM testing")
+    p.add_argument("--port", type=int, default=8900)
+    p.add_argument("--ttft", type=float, default=0.3)
+    p.add_argument("--fail-rate", type=float, default=0.0)
+    p.add_argument("--slow-every", type=int, default=0)
+    p.add_argument("--slow-ttft", type=float, default=5.0)
+    p.set_defaults(func=bench_llm_stub)
+
+    p = sub.add_parser("router", help="Drive the LLM router against a slow/failing stub and a healthy fallback")
+    p.add_argument("--requests", type=int, default=40)
+    p.add_argument("--ttft", type=float, default=0.1)
+    p.add_argument("--fail-rate", type=float, default=0.1)
+    p.add_argument("--slow-every", type=int, default=4)
+    p.add_argument("--slow-ttft", type=float, default=3.0)
+    p.add_argument("--hedge-delay", type=float, default=0.5)
+    p.set_defaults(func=bench_router)
+
+    p = sub.add_parser("updates", help="Reply latency as chats grow: serial handlers vs per-chat ordered processing")
+    p.add_argument("--chats", default="1,10,50,200")
+    p.add_argument("--messages", type=int, default=1)
+    p.add_argument("--agent-time", type=float, default=0.5)
+    p.add_argument("--handler-time", type=float, default=0.01)
+    p.add_argument("--max-runs", type=int, default=16)
+    p.add_argument("--workers", type=int, default=32)
+    p.add_argument("--max-serial", type=float, default=60.0, help="Skip serial runs expected to take longer")
+    p.set_defaults(func=bench_updates)
+
+    p = sub.add_parser("webhook", help="POST fake Telegram updates to a running webhook (use a test bot)")
+    p.add_argument("--url", default="http://127.0.0.1:8443/telegram")
+    p.add_argument("--secret", default="", help="WEBHOOK_SECRET of the running bot")
+    p.add_argument("--chats", type=int, default=20)
+    p.add_argument("--messages", type=int, default=5)
+    p.add_argument("--concurrency", type=int, default=20)
+    p.add_argument("--text", default="ping")
+    p.add_argument("--first-chat-id", type=int, default=900000000)
+    p.add_argument("--first-update-id", type=int, default=1)
+    p.set_defaults(func=bench_webhook)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,9 @@ import json
 import datetime
 import traceback
 import mimetypes
+import secrets
 from telegram import Update
+from telegram.constants import ChatAction
 from telegram.ext import (
     ApplicationBuilder,
     ContextTypes,
@@ -18,6 +20,13 @@ import config
 from core.agent import Agent
 from core.tools import ToolRegistry
 from core.watcher import ModuleWatcher
+from core.sessions import ChatLocks, SessionStore
+from core.tokens import history_tokens, message_tokens
+from core.streaming import DeltaBuffer
+from core.outbox import TelegramOutbox
+from core.updates import ChatOrderedUpdateProcessor
+from core.coalescer import InputCoalescer
+from core.context import SUMMARY_PREFIX
 
 # Enable logging
 logging.basicConfig(
@@ -36,7 +45,8 @@ watcher.start()
 agent = Agent(registry)
 
 # Persistence
-SESSIONS_FILE = "data/sessions.json"
+SESSIONS_FILE = "data/sessions.json" # Legacy whole-file store, migrated on first start
+SESSIONS_DB = "data/sessions.db"
 PROFILE_FILE = "data/profiles.json"
 DOWNLOADS_DIR = "downloads"
 
@@ -49,23 +59,6 @@ def ensure_downloads_dir():
 ensure_downloads_dir()
 
 
-def load_sessions():
-    if os.path.exists(SESSIONS_FILE):
-        try:
-            with open(SESSIONS_FILE, "r") as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
-
-
-def save_sessions():
-    if not os.path.exists("data"):
-        os.makedirs("data")
-    with open(SESSIONS_FILE, "w") as f:
-        json.dump(user_sessions, f)
-
-
 def load_profiles():
     if os.path.exists(PROFILE_FILE):
         try:
@@ -76,21 +69,40 @@ def load_profiles():
     return {}
 
 
-# In-memory session storage (loaded from file)
-user_sessions = load_sessions()
+# Per-chat session storage (each chat is loaded on first access)
+sessions = SessionStore(SESSIONS_DB, legacy_file=SESSIONS_FILE)
 user_profiles = load_profiles()
 user_usage = {} # Session token usage
-session_lock = asyncio.Lock()
+outbox = TelegramOutbox() # Flood limits for every Bot API call
+session_locks = ChatLocks() # One lock per chat; summarizing one chat never blocks another
 
-# Token Encoder
-def count_tokens(text):
-    if not text: return 0
-    return len(str(text)) // 4
+llm_usage = {} # Provider-reported token usage per chat (prompt/completion/total, context-cache hits/misses)
 
 # Task management for stopping
 running_tasks = {}
+# Agent turns running at once (each holds an LLM stream and tool calls)
+agent_run_slots = asyncio.Semaphore(getattr(config, "MAX_AGENT_RUNS", 16))
+
+# Minimum seconds between edits of the streaming status message
+EDIT_INTERVAL = 3.0
+
+# History compaction: summarize when a chat is past either limit, keep the newest messages verbatim
+COMPACT_AFTER_MESSAGES = 15
+COMPACT_AFTER_TOKENS = 4000  # Tokenizer count (core/tokens.py), memoized per message
+COMPACT_KEEP_RECENT = 6
+# Summaries are appended after the earlier ones so the cached prompt prefix survives a compaction;
+# past this many they are folded into one (the only compaction that rewrites the start of history)
+COMPACT_MAX_SUMMARIES = getattr(config, "COMPACT_MAX_SUMMARIES", 4)
+compaction_tasks = {}
 
-async def summarize_history(history_slice):
+def cache_hit_ratio(usage):
+    """Share of prompt tokens served from the provider's context cache."""
+    hit = usage.get("prompt_cache_hit_tokens", 0)
+    total = hit + usage.get("prompt_cache_miss_tokens", 0)
+    return hit / total if total else 0.0
+
+
+async def summarize_history(history_slice, chat_id=None):
     """Summarizes a slice of conversation history."""
     try:
         prompt = "Summarize the following conversation concisely in 2-3 sentences, preserving key facts and context:"
@@ -101,7 +113,7 @@ async def summarize_history(history_slice):
             msgs.append({"role": "user", "content": f"{role}: {content}"})
 
         # Use agent's LLM non-streaming
-        response_msg = await agent.llm.generate(msgs, stream=False)
+        response_msg = await agent.llm.generate(msgs, stream=False, chat_id=chat_id, priority="summary")
         if response_msg and response_msg.content:
             return response_msg.content
     except Exception as e:
@@ -109,11 +121,83 @@ async def summarize_history(history_slice):
     return None
 
 
+def leading_summaries(hist):
+    """Number of summary messages at the start of the history."""
+    count = 0
+    for msg in hist:
+        if msg.get("role") != "system" or not str(msg.get("content", "")).startswith(SUMMARY_PREFIX):
+            break
+        count += 1
+    return count
+
+
+def needs_compaction(hist):
+    if len(hist) - leading_summaries(hist) <= COMPACT_KEEP_RECENT:
+        return False
+    total_tokens = history_tokens(hist)
+    return len(hist) > COMPACT_AFTER_MESSAGES or total_tokens > COMPACT_AFTER_TOKENS
+
+
+def schedule_compaction(chat_id):
+    """Starts a background summarization of the chat's older history, if it needs one."""
+    chat_id = str(chat_id)
+    task = compaction_tasks.get(chat_id)
+    if task and not task.done():
+        return
+    if not needs_compaction(sessions.get(chat_id)):
+        return
+
+    task = asyncio.create_task(compact_history(chat_id))
+    compaction_tasks[chat_id] = task
+
+    def _forget(t):
+        if compaction_tasks.get(chat_id) is t:
+            del compaction_tasks[chat_id]
+
+    task.add_done_callback(_forget)
+
+
+async def compact_history(chat_id):
+    """
+    Replaces the messages between the earlier summaries and the newest ones
+    with a summary appended after the earlier summaries, so the start of the
+    history (and the provider's cached prefix) is left as it was. Once there
+    are COMPACT_MAX_SUMMARIES summaries they are folded into the new one.
+    The LLM call runs without holding the chat lock; the result is only
+    applied if the summarized prefix is still at the start of the history.
+    """
+    async with session_locks.get(chat_id):
+        hist = list(sessions.get(chat_id))
+    if not needs_compaction(hist):
+        return
+
+    keep = leading_summaries(hist)
+    if keep >= COMPACT_MAX_SUMMARIES:
+        keep = 0
+    to_summarize = hist[:-COMPACT_KEEP_RECENT]
+    summary = await summarize_history(to_summarize[keep:], chat_id=chat_id)
+    if not summary:
+        return
+
+    async with session_locks.get(chat_id):
+        current = sessions.get(chat_id)
+        # Cleared or rewritten while we were summarizing: drop the stale summary
+        if current[:len(to_summarize)] != to_summarize:
+            return
+        new_hist = current[:keep]
+        new_hist.append({"role": "system", "content": f"{SUMMARY_PREFIX}: {summary}"})
+        new_hist.extend(current[len(to_summarize):])
+        sessions.set(chat_id, new_hist)
+        await sessions.save(chat_id)
+    logging.info(f"Summarized history for {chat_id}")
+
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = str(update.effective_chat.id)
-    async with session_lock:
-        user_sessions[chat_id] = []
-        save_sessions()
+    agent.tool_selector.forget(chat_id)
+    async with session_locks.get(chat_id):
+        sessions.set(chat_id, [])
+        await sessions.save(chat_id)
 
     await context.bot.send_message(
         chat_id=update.effective_chat.id,
@@ -123,14 +207,19 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def clear_memory(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = str(update.effective_chat.id)
-    async with session_lock:
-        user_sessions[chat_id] = []
-        save_sessions()
+    coalescer.discard(chat_id)
+    agent.tool_selector.forget(chat_id)
+    async with session_locks.get(chat_id):
+        sessions.set(chat_id, [])
+        await sessions.save(chat_id)
     await context.bot.send_message(chat_id=chat_id, text="Memory cleared.")
 
 
 async def stop_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = str(update.effective_chat.id)
+    if coalescer.discard(chat_id) and chat_id not in running_tasks:
+        await context.bot.send_message(chat_id=chat_id, text="Stopped.")
+        return
     if chat_id in running_tasks:
         task = running_tasks[chat_id]
         if not task.done():
@@ -142,6 +231,43 @@ async def stop_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await context.bot.send_message(chat_id=chat_id, text="Nothing is running.")
 
 
+def start_agent_run(chat_id, prompt, context, priority="interactive"):
+    """
+    Starts an agent turn for the chat in the background, cancelling the one
+    still running. Handlers return right away, so the chat's next update (or
+    /stop) is processed without waiting for the LLM.
+    """
+    chat_id = str(chat_id)
+    previous = running_tasks.get(chat_id)
+    if previous is not None and not previous.done():
+        previous.cancel()
+
+    task = asyncio.create_task(run_agent_turn(chat_id, prompt, context, priority, previous))
+    running_tasks[chat_id] = task
+
+    def finished(t):
+        if running_tasks.get(chat_id) is t:
+            del running_tasks[chat_id]
+        if not t.cancelled() and t.exception() is not None:
+            logging.error(f"Task failed: {t.exception()}")
+
+    task.add_done_callback(finished)
+    return task
+
+
+# Bursts of messages / album items become one agent turn
+coalescer = InputCoalescer(start_agent_run)
+
+
+async def run_agent_turn(chat_id, prompt, context, priority="interactive", previous=None):
+    """One agent turn, bounded by MAX_AGENT_RUNS across all chats."""
+    if previous is not None and not previous.done():
+        # Let the cancelled turn finish cleaning up so history writes stay in order
+        await asyncio.wait([previous])
+    async with agent_run_slots:
+        await process_agent_loop(chat_id, prompt, context, priority=priority)
+
+
 async def save_user_file(file_obj, chat_id, original_filename=None):
     """Downloads a file and returns the local path."""
     timestamp = int(time.time())
@@ -169,21 +295,8 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_input = update.message.text
     chat_id = str(update.effective_chat.id)
 
-    # Cancel previous task if running
-    if chat_id in running_tasks:
-        task = running_tasks[chat_id]
-        if not task.done():
-            task.cancel()
-
-    # Create new task
-    task = asyncio.create_task(process_agent_loop(chat_id, user_input, context))
-    running_tasks[chat_id] = task
-    try:
-        await task
-    except asyncio.CancelledError:
-        pass
-    except Exception as e:
-        logging.error(f"Task failed: {e}")
+    # Quick follow-up messages are gathered into one turn (see InputCoalescer)
+    coalescer.add(chat_id, user_input, context)
 
 
 async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -199,16 +312,15 @@ async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
         caption = update.message.caption or ""
 
         # Add file context to history immediately
-        async with session_lock:
-            if chat_id not in user_sessions:
-                user_sessions[chat_id] = []
-            user_sessions[chat_id].append(
+        async with session_locks.get(chat_id):
+            sessions.append(
+                chat_id,
                 {
                     "role": "user",
                     "content": f"[Voice file uploaded to {filepath}]. Caption: {caption}",
                 }
             )
-            save_sessions()
+            await sessions.save(chat_id)
 
         # Trigger Agent
         await context.bot.edit_message_text(
@@ -221,17 +333,7 @@ async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if caption:
             prompt += f" Context: {caption}"
 
-        if chat_id in running_tasks:
-            task = running_tasks[chat_id]
-            if not task.done():
-                task.cancel()
-
-        task = asyncio.create_task(process_agent_loop(chat_id, prompt, context))
-        running_tasks[chat_id] = task
-        try:
-            await task
-        except asyncio.CancelledError:
-            pass
+        coalescer.add(chat_id, prompt, context, kind="voice", explicit=bool(caption))
 
     except Exception as e:
         await context.bot.send_message(
@@ -242,7 +344,7 @@ async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = str(update.effective_chat.id)
 
-    # Handle multiple photos (media groups) properly by just logging them and letting agent pick up
+    # Each photo of an album is logged to history; the coalescer starts one run for the album
     try:
         photo = update.message.photo[-1]
         file = await photo.get_file()
@@ -250,55 +352,27 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         caption = update.message.caption or ""
 
-        async with session_lock:
-            if chat_id not in user_sessions:
-                user_sessions[chat_id] = []
-            user_sessions[chat_id].append(
+        async with session_locks.get(chat_id):
+            sessions.append(
+                chat_id,
                 {
                     "role": "user",
                     "content": f"[Image uploaded to {filepath}]. Caption: {caption}",
                 }
             )
-            save_sessions()
-
-        # Trigger Agent
-        # If part of an album, subsequent triggers might cancel this one, but history is saved.
-        # We rely on the last trigger to process all recent images.
+            await sessions.save(chat_id)
 
+        # Trigger Agent. Album items arrive as separate updates; the coalescer
+        # gathers them (same media_group_id) into a single run.
         prompt = "Analyze this image."
         if caption:
             prompt = caption  # Use caption as the prompt if provided
 
-        # Optional: Check if we are already processing (simple debounce)
-        # But cancellation handles this. The last image in a burst will trigger the final analysis.
-
-        if chat_id in running_tasks:
-            task = running_tasks[chat_id]
-            if not task.done():
-                task.cancel()
-
-        # Send status only if no recent status exists?
-        # Actually, let's just send a temp message that gets edited by agent loop
-        status_msg = await context.bot.send_message(
-            chat_id=chat_id, text="Image received. Analyzing..."
+        coalescer.add(
+            chat_id, prompt, context, kind="image", explicit=bool(caption),
+            media_group_id=update.message.media_group_id,
         )
 
-        # We need to pass the status_msg ID to process_agent_loop so it can edit it.
-        # But process_agent_loop creates its own "Thinking..." message.
-        # Let's delete our temp message to avoid clutter or let agent overwrite.
-        # Better: Modify process_agent_loop to accept an existing message object to edit?
-        # For simplicity, we just delete our temp message and let agent create its own.
-        await context.bot.delete_message(
-            chat_id=chat_id, message_id=status_msg.message_id
-        )
-
-        task = asyncio.create_task(process_agent_loop(chat_id, prompt, context))
-        running_tasks[chat_id] = task
-        try:
-            await task
-        except asyncio.CancelledError:
-            pass
-
     except Exception as e:
         await context.bot.send_message(
             chat_id=chat_id, text=f"Error processing image: {str(e)}"
@@ -314,39 +388,24 @@ async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         caption = update.message.caption or ""
 
-        async with session_lock:
-            if chat_id not in user_sessions:
-                user_sessions[chat_id] = []
-            user_sessions[chat_id].append(
+        async with session_locks.get(chat_id):
+            sessions.append(
+                chat_id,
                 {
                     "role": "user",
                     "content": f"[File uploaded to {filepath}]. Caption: {caption}",
                 }
             )
-            save_sessions()
+            await sessions.save(chat_id)
 
         prompt = "Analyze this file."
         if caption:
             prompt = caption
 
-        if chat_id in running_tasks:
-            task = running_tasks[chat_id]
-            if not task.done():
-                task.cancel()
-
-        status_msg = await context.bot.send_message(
-            chat_id=chat_id, text="File received. Processing..."
+        coalescer.add(
+            chat_id, prompt, context, kind="file", explicit=bool(caption),
+            media_group_id=update.message.media_group_id,
         )
-        await context.bot.delete_message(
-            chat_id=chat_id, message_id=status_msg.message_id
-        )
-
-        task = asyncio.create_task(process_agent_loop(chat_id, prompt, context))
-        running_tasks[chat_id] = task
-        try:
-            await task
-        except asyncio.CancelledError:
-            pass
 
     except Exception as e:
         await context.bot.send_message(
@@ -354,7 +413,7 @@ async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
 
 
-async def process_agent_loop(chat_id, user_input, context):
+async def process_agent_loop(chat_id, user_input, context, priority="interactive"):
     chat_id_str = str(chat_id)
 
     # 1. Check Usage Quota
@@ -363,38 +422,11 @@ async def process_agent_loop(chat_id, user_input, context):
         await context.bot.send_message(chat_id=chat_id, text="⚠️ Session usage quota exceeded (50,000 tokens). Please use /clear to reset.")
         return
 
-    async with session_lock:
-        if chat_id_str not in user_sessions:
-            user_sessions[chat_id_str] = []
-
-        # 2. Smart Context Summarization
-        hist = user_sessions[chat_id_str]
-        # Calculate roughly
-        total_tokens = sum(count_tokens(m.get("content", "")) for m in hist)
-
-        # If history is too long ( > 15 messages OR > 4000 tokens)
-        if len(hist) > 15 or total_tokens > 4000:
-            # We want to keep the last 5 messages intact
-            if len(hist) > 6:
-                to_summarize = hist[:-6]
-                kept_history = hist[-6:]
-
-                # Send temporary status
-                status_msg = await context.bot.send_message(chat_id=chat_id, text="🔄 Optimizing memory...")
-
-                summary = await summarize_history(to_summarize)
-
-                if summary:
-                    # Replace old history with summary + recent
-                    new_hist = [{"role": "system", "content": f"[Previous Conversation Summary]: {summary}"}] + kept_history
-                    user_sessions[chat_id_str] = new_hist
-                    save_sessions()
-                    logging.info(f"Summarized history for {chat_id_str}")
-
-                await context.bot.delete_message(chat_id=chat_id, message_id=status_msg.message_id)
-
+    # 2. History is compacted in the background after each turn (see schedule_compaction),
+    # so this turn starts right away with whatever is ready.
+    async with session_locks.get(chat_id_str):
         # Shallow copy of CLEAN history
-        session_history_start = list(user_sessions[chat_id_str])
+        session_history_start = list(sessions.get(chat_id_str))
 
     # Copy for agent to modify during this turn
     current_history = list(session_history_start)
@@ -408,8 +440,13 @@ async def process_agent_loop(chat_id, user_input, context):
     status_msg = await context.bot.send_message(chat_id=chat_id, text="Thinking...")
     last_status = ""
     final_response = ""
-    streamed_text = ""
+    streamed_text = DeltaBuffer()
     last_edit_time = 0
+    turn_llm_usage = {
+        "calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0,
+        "prompt_cache_hit_tokens": 0, "prompt_cache_miss_tokens": 0,
+    }
+    turn_context_peak = {}  # Largest context budget report of the turn's LLM calls
 
     tool_ctx = {
         "bot": context.bot,
@@ -424,7 +461,7 @@ async def process_agent_loop(chat_id, user_input, context):
         nonlocal last_edit_time, last_status
         current_time = time.time()
 
-        if not force and (current_time - last_edit_time < 3.0):
+        if not force and (current_time - last_edit_time < EDIT_INTERVAL):
             return
 
         if text == last_status:
@@ -450,13 +487,16 @@ async def process_agent_loop(chat_id, user_input, context):
 
     try:
         async for update_data in agent.run(
-            user_input, history=current_history, tool_context=tool_ctx
+            user_input, history=current_history, tool_context=tool_ctx, priority=priority
         ):
             status = update_data.get("status")
 
             if status == "thinking":
-                msg = f"Thinking: {update_data.get('message', '...')}"
-                await safe_edit(msg)
+                # Status ticks show as "typing..." instead of costing an edit each
+                try:
+                    await context.bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
+                except Exception as e:
+                    logging.warning(f"send_chat_action error (non-fatal): {e}")
 
             elif status == "tool_use":
                 tool_name = update_data.get("tool")
@@ -464,9 +504,20 @@ async def process_agent_loop(chat_id, user_input, context):
                 await safe_edit(msg)
 
             elif status == "final_stream":
-                content = update_data.get("content")
-                streamed_text += content
-                await safe_edit(streamed_text + " ▌")
+                streamed_text.append(update_data.get("content"))
+                # Only build the text when an edit can actually go out
+                if streamed_text.dirty and time.time() - last_edit_time >= EDIT_INTERVAL:
+                    await safe_edit(streamed_text.text() + " ▌")
+
+            elif status == "usage":
+                turn_llm_usage["calls"] += 1
+                for key in turn_llm_usage:
+                    if key != "calls":
+                        turn_llm_usage[key] += update_data.get(key, 0)
+
+            elif status == "context_budget":
+                if update_data.get("used", 0) >= turn_context_peak.get("used", 0):
+                    turn_context_peak = update_data
 
             elif status == "final":
                 final_response = update_data.get("content")
@@ -535,21 +586,38 @@ async def process_agent_loop(chat_id, user_input, context):
 
     # GARBAGE COLLECTION & USAGE TRACKING:
     if final_response:
-        # Update usage
-        input_tokens = count_tokens(user_input)
-        output_tokens = count_tokens(final_response)
+        # Update usage: conversation tokens count against the quota
+        user_message = {"role": "user", "content": user_input}
+        assistant_message = {"role": "assistant", "content": final_response}
+        input_tokens = message_tokens(user_message)
+        output_tokens = message_tokens(assistant_message)
         # Add rough estimate for system prompt and tools
         turn_usage = input_tokens + output_tokens + 500
         user_usage[chat_id_str] = user_usage.get(chat_id_str, 0) + turn_usage
 
-        # Update history
-        new_history = list(session_history_start)
-        new_history.append({"role": "user", "content": user_input})
-        new_history.append({"role": "assistant", "content": final_response})
+        # What the provider actually billed (stream include_usage), summed over the turn's LLM calls
+        if turn_llm_usage["calls"]:
+            totals = llm_usage.setdefault(chat_id_str, {key: 0 for key in turn_llm_usage})
+            for key, value in turn_llm_usage.items():
+                totals[key] += value
+            logging.info(
+                f"LLM usage chat={chat_id_str} calls={turn_llm_usage['calls']} "
+                f"prompt={turn_llm_usage['prompt_tokens']} completion={turn_llm_usage['completion_tokens']} "
+                f"cache hit={cache_hit_ratio(turn_llm_usage):.0%} (chat {cache_hit_ratio(totals):.0%}) "
+                f"context peak={turn_context_peak.get('used', 0)}/{turn_context_peak.get('budget', 0)} "
+                f"(estimated conversation tokens {input_tokens + output_tokens})"
+            )
+
+        # Update history. Start from the stored copy rather than session_history_start:
+        # a background compaction may have replaced the older part during this turn.
+        async with session_locks.get(chat_id_str):
+            new_history = list(sessions.get(chat_id_str))
+            new_history.append(user_message)
+            new_history.append(assistant_message)
+            sessions.set(chat_id_str, new_history)
+            await sessions.save(chat_id_str)
 
-        async with session_lock:
-            user_sessions[chat_id_str] = new_history
-            save_sessions()
+        schedule_compaction(chat_id_str)
 
 
 async def scheduled_task_callback(context: ContextTypes.DEFAULT_TYPE):
@@ -564,11 +632,23 @@ async def scheduled_task_callback(context: ContextTypes.DEFAULT_TYPE):
     # Note: We need to ensure we don't block the job queue worker too long.
     # process_agent_loop creates user session history, sends messages, etc.
     # It requires 'context' to have .bot and .job_queue. The passed 'context' has it.
-    await process_agent_loop(chat_id, prompt, context)
+    await run_agent_turn(str(chat_id), prompt, context, priority="scheduled")
 
 
 if __name__ == "__main__":
-    application = ApplicationBuilder().token(config.TELEGRAM_BOT_TOKEN).build()
+    # Webhook mode when WEBHOOK_URL is set (public https base URL), long polling otherwise
+    webhook_url = getattr(config, "WEBHOOK_URL", None)
+
+    # Every Bot API call (handlers, tools, job callbacks) goes through the outbox's flood limits
+    # Updates from different chats are handled concurrently, each chat's in order
+    update_processor = ChatOrderedUpdateProcessor(getattr(config, "CONCURRENT_UPDATES", 32))
+    application = (
+        ApplicationBuilder()
+        .token(config.TELEGRAM_BOT_TOKEN)
+        .rate_limiter(outbox)
+        .concurrent_updates(update_processor)
+        .build()
+    )
 
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("clear", clear_memory))
@@ -580,5 +660,23 @@ if __name__ == "__main__":
     application.add_handler(MessageHandler(filters.PHOTO, handle_photo))
     application.add_handler(MessageHandler(filters.Document.ALL, handle_document))
 
-    print("Bot is running...")
-    application.run_polling()
+    if webhook_url:
+        url_path = getattr(config, "WEBHOOK_PATH", "telegram").strip("/")
+        # Telegram sends it back in X-Telegram-Bot-Api-Secret-Token; other requests are rejected
+        secret_token = getattr(config, "WEBHOOK_SECRET", None) or secrets.token_urlsafe(32)
+        listen = getattr(config, "WEBHOOK_LISTEN", "0.0.0.0")
+        port = getattr(config, "WEBHOOK_PORT", 8443)
+        print(f"Bot is running (webhook on {listen}:{port}/{url_path})...")
+        application.run_webhook(
+            listen=listen,
+            port=port,
+            url_path=url_path,
+            webhook_url=f"{webhook_url.rstrip('/')}/{url_path}",
+            secret_token=secret_token,
+            cert=getattr(config, "WEBHOOK_CERT", None),
+            key=getattr(config, "WEBHOOK_KEY", None),
+            allowed_updates=Update.ALL_TYPES,
+        )
+    else:
+        print("Bot is running...")
+        application.run_polling()
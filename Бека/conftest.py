@@ -0,0 +1,8 @@
+import sys
+import types
+
+try:
+    import config  # noqa: F401
+except ImportError:
+    # config.py is local to each deployment (gitignored); every setting read by core/ has a default
+    sys.modules["config"] = types.ModuleType("config")
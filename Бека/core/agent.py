@@ -3,12 +3,27 @@ import re
 import traceback
 import asyncio
 import os
+import logging
+import config
 from core.llm import LLMService
+from core.tool_selection import ToolSelector
+from core.tokens import count_tokens, usage_dict
+from core.streaming import DeltaBuffer
+from core.prefetch import ContextPrefetcher
+from core.observations import ObservationReducer, ObservationStore
+from core.context import ContextAssembler
 
 class Agent:
     def __init__(self, tools_registry, system_prompt=None):
         self.llm = LLMService()
         self.tools = tools_registry
+        self.tool_selector = ToolSelector(tools_registry)
+        # Time / profile / memory for the prompt, instead of startup tool calls
+        self.prefetcher = ContextPrefetcher(tools_registry) if getattr(config, "CONTEXT_PREFETCH", True) else None
+        # Large tool results are cut down to the parts relevant to the request
+        self.observations = ObservationReducer()
+        # Each request of a run is fitted into CONTEXT_TOKEN_BUDGET
+        self.assembler = ContextAssembler()
 
         # Load system prompt from file if not provided
         if not system_prompt:
@@ -21,165 +36,332 @@ class Agent:
                 self.system_prompt = "You are a helpful AI agent."
         else:
             self.system_prompt = system_prompt
+        # Rendered once: the prompt prefix must be byte-identical on every call
+        self.system_message = self._render_system_prompt()
 
-    def _build_prompt(self, history):
+    def _render_system_prompt(self):
         # With Native Function Calling, we don't need to inject descriptions into text
         # But we must ensure the placeholder is handled if it exists
         try:
-            system_msg = self.system_prompt.format(tool_descriptions="Tools are provided via API.")
+            return self.system_prompt.format(tool_descriptions="Tools are provided via API.")
         except Exception as e:
             # Fallback if formatting fails (e.g. braces issues)
             try:
-                system_msg = self.system_prompt.replace("{tool_descriptions}", "Tools are provided via API.")
+                return self.system_prompt.replace("{tool_descriptions}", "Tools are provided via API.")
             except:
-                system_msg = self.system_prompt
+                return self.system_prompt
 
-        messages = [{"role": "system", "content": system_msg}]
-        messages.extend(history)
+    def _build_prompt(self, history, context_block="", context_at=None):
+        """
+        Prefix-stable layout for provider context caching: the system message
+        (rendered once), then the stored history as is. The per-turn [Context]
+        block goes right after the user message that started the run
+        (`context_at`, an index into history), so everything before it matches
+        the previous turn's request and later calls of the run only append.
+        """
+        messages = [{"role": "system", "content": self.system_message}]
+        if not context_block:
+            messages.extend(history)
+            return messages
+
+        if context_at is None:
+            context_at = len(history)
+        messages.extend(history[:context_at])
+        messages.append({"role": "system", "content": context_block})
+        messages.extend(history[context_at:])
         return messages
 
-    async def run(self, user_input, history=None, tool_context=None):
+    async def _execute_tool_safe(self, name, arguments, tool_context=None):
+        """Runs one tool call (cached / off-thread as registered). Never raises."""
+        try:
+            return await self.tools.execute_async(name, tool_context=tool_context, **arguments)
+        except Exception as e:
+            return f"Error executing tool '{name}': {str(e)}"
+
+    def _selection_query(self, user_input, history):
+        """Recent conversation text used to rank tools for this run."""
+        parts = [user_input]
+        for msg in history[-4:]:
+            content = msg.get("content")
+            if isinstance(content, str) and msg.get("role") in ("user", "assistant"):
+                parts.append(content)
+        return "\n".join(parts)
+
+    async def run(self, user_input, history=None, tool_context=None, priority="interactive"):
         """
         Main ReAct loop. Yields status updates asynchronously.
         Returns final response text.
+        `priority` is passed to the LLM scheduler ("interactive" or "scheduled").
         """
         if history is None:
             history = []
 
-        # Add user input to history if it's new
-        if not history or history[-1]["role"] != "user":
+        # The turn's prompt is its own user message, also after upload notes the bot
+        # logged ("[Image uploaded ...]"), as in the history saved after the turn
+        last = history[-1] if history else {}
+        if last.get("role") != "user" or last.get("content") != user_input:
             history.append({"role": "user", "content": user_input})
+        # Everything up to here is the previous turn's prefix; this run only appends after it
+        context_at = len(history)
 
         max_turns = 15 # Reduced limit
         turn = 0
 
-        definitions = self.tools.get_definitions()
-
-        while turn < max_turns:
-            turn += 1
-            yield {"status": "thinking", "message": "Analysing request..."}
-
-            # 1. Call LLM with streaming
-            messages = self._build_prompt(history)
-
-            # Use DeepSeek for complex reasoning
-            stream_gen = await self.llm.generate(
-                messages,
-                provider="deepseek",
-                model="default",
-                stream=True,
-                tools=definitions
+        # Prefetch runs alongside tool selection
+        prefetch = None
+        if self.prefetcher is not None:
+            prefetch = asyncio.ensure_future(
+                self.prefetcher.build((tool_context or {}).get("chat_id"), user_input)
             )
 
-            response_content = ""
-            tool_calls_buffer = [] # List of dicts to reconstruct tool calls
-
-            try:
-                async for chunk in stream_gen:
-                    delta = None
-                    if hasattr(chunk, 'choices') and chunk.choices:
-                         delta = chunk.choices[0].delta
-
-                    if delta:
-                        # Handle content
-                        if delta.content:
-                            response_content += delta.content
-                            yield {"status": "final_stream", "content": delta.content}
-
-                        # Handle tool calls
-                        if delta.tool_calls:
-                            for tc in delta.tool_calls:
-                                if tc.index is not None:
-                                    while len(tool_calls_buffer) <= tc.index:
-                                        tool_calls_buffer.append({"id": "", "function": {"name": "", "arguments": ""}, "type": "function"})
-
-                                    current_tc = tool_calls_buffer[tc.index]
-                                    if tc.id:
-                                        current_tc["id"] += tc.id
-                                    if tc.function:
-                                        if tc.function.name:
-                                            current_tc["function"]["name"] += tc.function.name
-                                        if tc.function.arguments:
-                                            current_tc["function"]["arguments"] += tc.function.arguments
-
-            except asyncio.CancelledError:
-                raise  # Propagate cancellation immediately
-            except Exception as e:
-                print(f"Error in stream: {e}")
-                pass
-
-            # Prepare Assistant Message
-            assistant_msg = {"role": "assistant", "content": response_content}
-            if tool_calls_buffer:
-                assistant_msg["tool_calls"] = tool_calls_buffer
-
-            history.append(assistant_msg)
+        # Send only the tools relevant to this request (plus the core set)
+        exposed = None
+        if getattr(config, "TOOL_SELECTION_ENABLED", True):
+            definitions, report = self.tool_selector.select(
+                self._selection_query(user_input, history), chat_id=(tool_context or {}).get("chat_id")
+            )
+            exposed = {d["function"]["name"] for d in definitions}
+            tools_tokens = report["tokens_sent"]
+            logging.info(
+                f"Tool selection: {report['selected']}/{report['total']} tools, "
+                f"~{report['tokens_saved']} prompt tokens saved per call"
+            )
+            yield {"status": "tool_selection", **report}
+        else:
+            definitions = self.tools.get_definitions()
+            tools_tokens = count_tokens(self.tools.get_definitions_json())
 
-            # 2. Check for Tool Call
-            if tool_calls_buffer:
-                tasks = []
-                calls_metadata = []
+        context_block = await prefetch if prefetch is not None else ""
 
-                for tool_call in tool_calls_buffer:
-                    func_name = tool_call["function"]["name"]
-                    args_str = tool_call["function"]["arguments"]
-                    call_id = tool_call["id"]
+        # Full text of oversized results, paged with read_observation; dropped when the run ends
+        store = ObservationStore()
+        tool_context = {**(tool_context or {}), "observation_store": store}
 
+        try:
+            while turn < max_turns:
+                turn += 1
+                yield {"status": "thinking", "message": "Analysing request..."}
+
+                # 1. Call LLM with streaming
+                view, block, view_context_at, budget = self.assembler.assemble(
+                    self.system_message, history, context_block, context_at, tools_tokens, store
+                )
+                messages = self._build_prompt(view, block, view_context_at)
+                logging.info(
+                    f"Context budget: {budget['used']}/{budget['budget']} tokens "
+                    f"(system {budget['system']}, tools {budget['tools']}, run {budget['current']}, "
+                    f"summary {budget['summary']}, recent {budget['recent']}, memory {budget['memory']}, "
+                    f"observations {budget['observations']}; squeezed {budget['squeezed']}, "
+                    f"left out {budget['dropped_messages']} older messages)"
+                )
+                yield {"status": "context_budget", **budget}
+
+                # Use DeepSeek for complex reasoning
+                stream_gen = await self.llm.generate(
+                    messages,
+                    provider="deepseek",
+                    model="default",
+                    stream=True,
+                    tools=definitions,
+                    chat_id=(tool_context or {}).get("chat_id"),
+                    priority=priority,
+                    tools_tokens=tools_tokens,
+                )
+
+                content = DeltaBuffer()
+                dispatcher = ToolCallDispatcher(self._execute_tool_safe, tool_context)
+
+                try:
+                    async for chunk in stream_gen:
+                        delta = None
+                        if hasattr(chunk, 'choices') and chunk.choices:
+                             delta = chunk.choices[0].delta
+
+                        # Last chunk of the stream: provider-reported token counts
+                        usage = usage_dict(getattr(chunk, "usage", None))
+                        if usage:
+                            yield {"status": "usage", **usage}
+
+                        if delta:
+                            # Handle content: merged into one event per flush window
+                            if content.append(delta.content):
+                                yield {"status": "final_stream", "content": content.take()}
+
+                            # Handle tool calls: launch each one as soon as its arguments are complete
+                            if delta.tool_calls:
+                                for tc in delta.tool_calls:
+                                    for call in dispatcher.feed(tc):
+                                        yield {"status": "tool_use", "tool": call["name"], "args": call["args"]}
+
+                except asyncio.CancelledError:
+                    dispatcher.cancel()
+                    raise  # Propagate cancellation immediately
+                except Exception as e:
+                    print(f"Error in stream: {e}")
+                    pass
+
+                if content.has_pending():
+                    yield {"status": "final_stream", "content": content.take()}
+                response_content = content.text()
+
+                # Stream finished: whatever is still pending is complete now
+                for call in dispatcher.flush():
+                    yield {"status": "tool_use", "tool": call["name"], "args": call["args"]}
+
+                # Prepare Assistant Message
+                assistant_msg = {"role": "assistant", "content": response_content}
+                if dispatcher.tool_calls:
+                    assistant_msg["tool_calls"] = dispatcher.tool_calls
+
+                history.append(assistant_msg)
+
+                # The model asked for a tool it wasn't shown: expose everything from now on
+                if exposed is not None and any(tc["function"]["name"] not in exposed for tc in dispatcher.tool_calls):
+                    definitions = self.tools.get_definitions()
+                    tools_tokens = count_tokens(self.tools.get_definitions_json())
+                    exposed = None
+                    self.tool_selector.record_fallback()
+                    logging.info("Tool selection fallback: exposing all tools")
+
+                # 2. Check for Tool Call
+                if dispatcher.tool_calls:
+                    # Tools have been running since their arguments arrived; collect in call order
                     try:
-                        args = json.loads(args_str)
-                    except:
-                        args = {} # Or handle error
-
-                    yield {"status": "tool_use", "tool": func_name, "args": args}
-                    calls_metadata.append({"id": call_id, "name": func_name})
-
-                    # Prepare execution wrapper
-                    async def execute_tool_safe(name, arguments):
-                        try:
-                            if self.tools.is_async(name):
-                                res = self.tools.execute(name, tool_context=tool_context, **arguments)
-                                if asyncio.iscoroutine(res):
-                                    return await res
-                                return res
-                            else:
-                                return await asyncio.to_thread(self.tools.execute, name, tool_context=tool_context, **arguments)
-                        except Exception as e:
-                            return f"Error executing tool '{name}': {str(e)}"
-
-                    tasks.append(execute_tool_safe(func_name, args))
-
-                # Parallel Execution
-                results = await asyncio.gather(*tasks, return_exceptions=True)
-
-                # Process Results
-                for i, result in enumerate(results):
-                    meta = calls_metadata[i]
-                    func_name = meta["name"]
-                    call_id = meta["id"]
-
-                    if isinstance(result, Exception):
-                        result_str = f"Error: {str(result)}"
-                    else:
-                        result_str = str(result)
-
-                    # CROP RESULT (Observation)
-                    if len(result_str) > 2000:
-                        result_str = result_str[:2000] + "... (truncated)"
-
-                    # Append Tool Message (OpenAI format)
-                    history.append({
-                        "role": "tool",
-                        "tool_call_id": call_id,
-                        "content": result_str,
-                        "name": func_name
-                    })
-
-                    result_msg = f"Tool '{func_name}' output:\n{result_str}"
-                    yield {"status": "observation", "result": result_msg}
-
-            else:
-                # No tool call = Final Answer
-                yield {"status": "final", "content": response_content}
-                return
-
-        yield {"status": "final", "content": "Error: Maximum turns reached."}
+                        results = await dispatcher.results()
+                    except asyncio.CancelledError:
+                        dispatcher.cancel()
+                        raise
+
+                    # Process Results
+                    for meta, result in zip(dispatcher.calls_metadata, results):
+                        func_name = meta["name"]
+                        call_id = meta["id"]
+
+                        if isinstance(result, Exception):
+                            result_str = f"Error: {str(result)}"
+                        else:
+                            result_str = str(result)
+
+                        # Large results: the parts that matter for this request (and the call's arguments),
+                        # the full text stays in the store for read_observation
+                        if func_name != "read_observation":
+                            arguments = dispatcher.tool_calls[meta["index"]]["function"]["arguments"]
+                            preview = self.observations.reduce(result_str, f"{user_input}\n{arguments}")
+                            if preview != result_str:
+                                handle = store.put(func_name, result_str)
+                                result_str = f"{preview}\n{store.describe(handle)}"
+
+                        # Append Tool Message (OpenAI format)
+                        history.append({
+                            "role": "tool",
+                            "tool_call_id": call_id,
+                            "content": result_str,
+                            "name": func_name
+                        })
+
+                        result_msg = f"Tool '{func_name}' output:\n{result_str}"
+                        yield {"status": "observation", "result": result_msg}
+
+                else:
+                    # No tool call = Final Answer
+                    yield {"status": "final", "content": response_content}
+                    return
+
+            yield {"status": "final", "content": "Error: Maximum turns reached."}
+        finally:
+            store.close()
+
+
+class ToolCallDispatcher:
+    """
+    Reassembles streamed tool-call fragments and starts each call as soon as
+    its arguments are complete, while the model is still emitting later calls.
+
+    A call counts as complete when its arguments parse as a JSON object, or
+    when the stream moves on to a higher index. Anything left over is started
+    by flush() once the stream ends.
+    """
+
+    def __init__(self, execute, tool_context=None):
+        self.execute = execute
+        self.tool_context = tool_context
+        self.tool_calls = []  # OpenAI-format tool calls, by stream index
+        self.calls_metadata = []  # {"id", "name"} in launch order
+        self.tasks = {}  # stream index -> asyncio.Task
+
+    def feed(self, tc):
+        """Merges one delta fragment. Returns the calls launched by it."""
+        if tc.index is None:
+            return []
+
+        while len(self.tool_calls) <= tc.index:
+            self.tool_calls.append({"id": "", "function": {"name": "", "arguments": ""}, "type": "function"})
+
+        current_tc = self.tool_calls[tc.index]
+        if tc.id:
+            current_tc["id"] += tc.id
+        if tc.function:
+            if tc.function.name:
+                current_tc["function"]["name"] += tc.function.name
+            if tc.function.arguments:
+                current_tc["function"]["arguments"] += tc.function.arguments
+
+        launched = []
+        # The index moved on: every earlier call is finished
+        for index in range(tc.index):
+            call = self._launch(index)
+            if call:
+                launched.append(call)
+
+        # Cheap check first: a complete JSON object must end with a brace
+        if tc.index not in self.tasks and current_tc["function"]["arguments"].rstrip().endswith("}"):
+            try:
+                args = json.loads(current_tc["function"]["arguments"])
+            except ValueError:
+                args = None
+            if isinstance(args, dict):
+                call = self._launch(tc.index, args)
+                if call:
+                    launched.append(call)
+
+        return launched
+
+    def flush(self):
+        """Launches every call that has not been started yet."""
+        launched = []
+        for index in range(len(self.tool_calls)):
+            call = self._launch(index, final=True)
+            if call:
+                launched.append(call)
+        return launched
+
+    def _launch(self, index, args=None, final=False):
+        if index in self.tasks:
+            return None
+
+        tool_call = self.tool_calls[index]
+        func_name = tool_call["function"]["name"]
+        if not func_name and not final:
+            return None
+
+        if args is None:
+            try:
+                args = json.loads(tool_call["function"]["arguments"] or "{}")
+            except:
+                args = {}  # Or handle error
+            if not isinstance(args, dict):
+                args = {}
+
+        self.tasks[index] = asyncio.create_task(self.execute(func_name, args, self.tool_context))
+        self.calls_metadata.append({"id": tool_call["id"], "name": func_name, "index": index})
+        return {"name": func_name, "args": args}
+
+    async def results(self):
+        """Waits for all launched calls; results follow calls_metadata order."""
+        tasks = [self.tasks[meta["index"]] for meta in self.calls_metadata]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    def cancel(self):
+        for task in self.tasks.values():
+            if not task.done():
+                task.cancel()
@@ -0,0 +1,103 @@
+import asyncio
+import time
+from collections import Counter
+import config
+
+# Prompt for several uploads of one kind that came without a caption
+PLURAL_PROMPTS = {
+    "image": "Analyze these {n} images.",
+    "file": "Analyze these {n} files.",
+    "voice": "Please transcribe these {n} voice messages.",
+}
+
+
+class InputCoalescer:
+    """
+    Per-chat debounce window for incoming messages.
+
+    Texts, photos, documents and voice messages that arrive within
+    COALESCE_WINDOW seconds of each other are gathered into one prompt and
+    handed to on_flush(chat_id, prompt, context) once, instead of each one
+    starting (and cancelling) its own agent run. Album items (same
+    media_group_id) arrive as separate updates, so while one is pending the
+    window is COALESCE_MEDIA_WINDOW. A burst is flushed at the latest
+    COALESCE_MAX_WAIT seconds after its first message.
+    """
+
+    def __init__(self, on_flush, window=None, media_window=None, max_wait=None):
+        self.on_flush = on_flush
+        self.window = window if window is not None else getattr(config, "COALESCE_WINDOW", 1.0)
+        self.media_window = media_window if media_window is not None else getattr(config, "COALESCE_MEDIA_WINDOW", 2.0)
+        self.max_wait = max_wait if max_wait is not None else getattr(config, "COALESCE_MAX_WAIT", 4.0)
+        self._pending = {}  # chat_id -> {"items", "first", "timer", "context", "media_group"}
+        self.stats = {"messages": 0, "runs": 0}
+
+    def add(self, chat_id, prompt, context, kind="text", explicit=True, media_group_id=None):
+        """
+        Queues one incoming message. `explicit` prompts are the user's own words
+        (text, caption); implicit ones are the handler's default for the upload
+        and are merged per kind when several arrive together.
+        """
+        chat_id = str(chat_id)
+        now = time.monotonic()
+        self.stats["messages"] += 1
+
+        burst = self._pending.get(chat_id)
+        if burst is None:
+            burst = {"items": [], "first": now, "timer": None, "context": context, "media_group": False}
+            self._pending[chat_id] = burst
+        burst["items"].append({"prompt": prompt, "kind": kind, "explicit": explicit})
+        burst["context"] = context
+        burst["media_group"] = burst["media_group"] or media_group_id is not None
+
+        if self.window <= 0 and not burst["media_group"]:
+            self.flush(chat_id)
+            return
+
+        if burst["timer"] is not None:
+            burst["timer"].cancel()
+        window = self.media_window if burst["media_group"] else self.window
+        delay = min(window, burst["first"] + self.max_wait - now)
+        burst["timer"] = asyncio.get_running_loop().call_later(max(delay, 0), self.flush, chat_id)
+
+    def flush(self, chat_id):
+        burst = self._pending.pop(str(chat_id), None)
+        if burst is None:
+            return
+        if burst["timer"] is not None:
+            burst["timer"].cancel()
+        self.stats["runs"] += 1
+        self.on_flush(str(chat_id), self.combine(burst["items"]), burst["context"])
+
+    def discard(self, chat_id):
+        """Drops a pending burst without running it (e.g. on /stop or /clear)."""
+        burst = self._pending.pop(str(chat_id), None)
+        if burst is not None and burst["timer"] is not None:
+            burst["timer"].cancel()
+        return burst is not None
+
+    @staticmethod
+    def combine(items):
+        if len(items) == 1:
+            return items[0]["prompt"]
+
+        parts = [item["prompt"] for item in items if item["explicit"]]
+        # An album caption covers the whole album: no default prompt for kinds the user described
+        seen = {item["kind"] for item in items if item["explicit"]}
+        implicit = [item for item in items if not item["explicit"]]
+        counts = Counter(item["kind"] for item in implicit)
+        for item in implicit:
+            kind = item["kind"]
+            if kind in seen:
+                continue
+            seen.add(kind)
+            if counts[kind] > 1 and kind in PLURAL_PROMPTS:
+                parts.append(PLURAL_PROMPTS[kind].format(n=counts[kind]))
+            else:
+                parts.append(item["prompt"])
+        return "\n".join(parts)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["runs_saved"] = stats["messages"] - stats["runs"] - sum(len(b["items"]) for b in self._pending.values())
+        return stats
@@ -0,0 +1,158 @@
+import re
+import config
+from core.tokens import count_tokens, message_tokens, history_tokens
+
+SUMMARY_PREFIX = "[Previous Conversation Summary]"
+_HANDLE_RE = re.compile(r'stored as "(obs-\d+)"')
+
+# Upper bound per section, as a share of the budget; observations get what's left
+DEFAULT_SHARES = {"summary": 0.1, "recent": 0.35, "memory": 0.1}
+
+
+class ContextAssembler:
+    """
+    Builds each LLM request of an agent run under CONTEXT_TOKEN_BUDGET.
+
+    Sections are filled in priority order: the system prompt, tool
+    definitions and the run itself (its user message and the assistant's
+    calls) always go in. After them come the compaction summaries, the
+    recent turns (newest first, whole messages), the [Context] block (memory
+    lines are dropped last to first) and the tool observations. Summary,
+    recent turns and memory are each capped at a share of the budget
+    (CONTEXT_SHARES).
+
+    When the observations don't fit, the oldest are squeezed first: the
+    message keeps a short head and a read_observation handle, and the full
+    text goes to the run's observation store. Squeezing edits the run's
+    history in place, so later requests in the run keep the same prefix.
+    Older turns left out of a request stay in the stored history.
+    """
+
+    SQUEEZED_CHARS = 300
+
+    def __init__(self, budget=None, shares=None):
+        self.budget = budget or getattr(config, "CONTEXT_TOKEN_BUDGET", 16000)
+        self.shares = {**DEFAULT_SHARES, **(shares or getattr(config, "CONTEXT_SHARES", {}))}
+        self.stats = {"requests": 0, "squeezed": 0, "dropped_messages": 0, "over_budget": 0}
+
+    def assemble(self, system_message, history, context_block="", context_at=None, tools_tokens=0, store=None):
+        """
+        Returns (history, context_block, context_at, report) to lay out with
+        Agent._build_prompt. `context_at` is the index just past the run's
+        user message; the report has the tokens used per section.
+        """
+        if context_at is None:
+            context_at = len(history)
+        summaries = 0
+        while (
+            summaries < context_at - 1
+            and history[summaries].get("role") == "system"
+            and str(history[summaries].get("content", "")).startswith(SUMMARY_PREFIX)
+        ):
+            summaries += 1
+        earlier = history[summaries:context_at - 1]
+        current = history[max(context_at - 1, 0):context_at]
+        run = history[context_at:]
+        observations = [m for m in run if m.get("role") == "tool"]
+
+        report = {
+            "budget": self.budget,
+            "system": count_tokens(system_message) + 4,
+            "tools": tools_tokens,
+            "current": history_tokens(current) + history_tokens([m for m in run if m.get("role") != "tool"]),
+        }
+        remaining = self.budget - report["system"] - report["tools"] - report["current"]
+        # Observations can shrink to a stub each, never to nothing: keep room for that
+        remaining -= len(observations) * self._stub_tokens()
+
+        summary_part = history[:summaries]
+        report["summary"] = history_tokens(summary_part)
+        if report["summary"] > min(remaining, self.budget * self.shares["summary"]):
+            # Keep the newest summaries (they cover the most recent past)
+            while summary_part and history_tokens(summary_part) > min(remaining, self.budget * self.shares["summary"]):
+                summary_part = summary_part[1:]
+            report["summary"] = history_tokens(summary_part)
+        remaining -= report["summary"]
+
+        recent_cap = min(remaining, self.budget * self.shares["recent"])
+        start = len(earlier)
+        used = 0
+        while start > 0 and used + message_tokens(earlier[start - 1]) <= recent_cap:
+            start -= 1
+            used += message_tokens(earlier[start])
+        # A request never starts in the middle of a turn
+        while start < len(earlier) and earlier[start].get("role") != "user":
+            used -= message_tokens(earlier[start])
+            start += 1
+        recent = earlier[start:]
+        report["recent"] = used
+        report["dropped_messages"] = (summaries - len(summary_part)) + start
+        remaining -= used
+
+        context_block = self._fit_block(context_block, min(remaining, self.budget * self.shares["memory"]))
+        report["memory"] = count_tokens(context_block) + 4 if context_block else 0
+        remaining -= report["memory"]
+
+        # Older observations are squeezed first; the newest stay whole as long as possible
+        remaining += len(observations) * self._stub_tokens()
+        total = history_tokens(observations)
+        squeezed = 0
+        for message in observations:
+            if total <= remaining:
+                break
+            if message.get("_squeezed") or len(str(message.get("content", ""))) <= self.SQUEEZED_CHARS * 2:
+                continue
+            before = message_tokens(message)
+            self._squeeze(message, store)
+            total += message_tokens(message) - before
+            squeezed += 1
+        report["observations"] = total
+        report["squeezed"] = squeezed
+        report["used"] = sum(report[key] for key in ("system", "tools", "current", "summary", "recent", "memory", "observations"))
+
+        self.stats["requests"] += 1
+        self.stats["squeezed"] += squeezed
+        self.stats["dropped_messages"] += report["dropped_messages"]
+        if report["used"] > self.budget:
+            self.stats["over_budget"] += 1
+
+        view = summary_part + recent + current + run
+        return view, context_block, len(summary_part) + len(recent) + len(current), report
+
+    def _stub_tokens(self):
+        # Head of the text plus the handle line
+        return self.SQUEEZED_CHARS // 3 + 40
+
+    @staticmethod
+    def _fit_block(block, limit):
+        """The [Context] block within `limit` tokens, dropping memory lines from the end."""
+        lines = block.split("\n") if block else []
+        while lines and count_tokens("\n".join(lines)) + 4 > limit:
+            if len(lines) > 2 and lines[-1].startswith("- "):
+                lines.pop()
+                if lines[-1] == "Memory:":
+                    lines.pop()
+            else:
+                return ""
+        return "\n".join(lines)
+
+    def _squeeze(self, message, store):
+        content = str(message.get("content", ""))
+        match = _HANDLE_RE.search(content)
+        if match:
+            handle = match.group(1)
+        elif store is not None:
+            handle = store.put(message.get("name", "tool"), content)
+        else:
+            handle = None
+
+        head = content[:self.SQUEEZED_CHARS].rstrip()
+        squeezed = f"{head}\n[... squeezed to fit the context budget]"
+        if handle is not None and store is not None:
+            squeezed += f"\n{store.describe(handle)}"
+        message["content"] = squeezed
+        message["_squeezed"] = True
+        message.pop("_tokens", None)
+
+    def get_stats(self):
+        return dict(self.stats)
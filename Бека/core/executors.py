@@ -0,0 +1,262 @@
+import asyncio
+import os
+import pickle
+import select
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import config
+from core.tool_worker import HEADER, write_frame
+
+# Execution classes for blocking tools: pool size and default per-call timeout (seconds)
+DEFAULT_POOL_SIZES = {
+    "fast": 4,  # Local, quick work: files, profiles, ChromaDB memory
+    "io": 16,  # Network requests and API calls
+    "cpu": 2,  # Parsing / number crunching that holds the GIL
+    "subprocess": 4,  # Shell commands, pip, yt-dlp downloads
+}
+DEFAULT_TIMEOUTS = {
+    "fast": 30,
+    "io": 120,
+    "cpu": 120,
+    "subprocess": 900,
+}
+DEFAULT_CLASS = "io"
+
+
+class ToolExecutors:
+    """
+    One bounded thread pool per execution class, so slow scrapes or a long
+    download can't starve quick tools. Tracks queue depth and queue wait time
+    per class for tuning the pool sizes.
+
+    The timeout covers queue wait plus run time. A call that times out while
+    still queued never starts; a running worker thread can't be interrupted
+    and keeps its slot until the tool returns.
+    """
+
+    def __init__(self, sizes=None, timeouts=None):
+        sizes = {**DEFAULT_POOL_SIZES, **(sizes or getattr(config, "TOOL_EXECUTOR_SIZES", {}))}
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or getattr(config, "TOOL_EXECUTOR_TIMEOUTS", {}))}
+        self.pools = {
+            name: ThreadPoolExecutor(max_workers=size, thread_name_prefix=f"tool-{name}")
+            for name, size in sizes.items()
+        }
+        self.sizes = sizes
+        self._lock = threading.Lock()
+        self.stats = {
+            name: {"submitted": 0, "completed": 0, "timeouts": 0, "queued": 0, "running": 0,
+                   "wait_total": 0.0, "wait_max": 0.0}
+            for name in sizes
+        }
+
+    def resolve(self, exec_class):
+        return exec_class if exec_class in self.pools else DEFAULT_CLASS
+
+    async def run(self, exec_class, func, *args, timeout=None):
+        """Runs func(*args) in the class's pool. Returns an error string on timeout."""
+        exec_class = self.resolve(exec_class)
+        timeout = timeout or self.timeouts.get(exec_class)
+        stats = self.stats[exec_class]
+        submitted = time.perf_counter()
+
+        with self._lock:
+            stats["submitted"] += 1
+            stats["queued"] += 1
+
+        state = {"started": False}
+
+        def job():
+            wait = time.perf_counter() - submitted
+            with self._lock:
+                state["started"] = True
+                stats["queued"] -= 1
+                stats["running"] += 1
+                stats["wait_total"] += wait
+                stats["wait_max"] = max(stats["wait_max"], wait)
+            try:
+                return func(*args)
+            finally:
+                with self._lock:
+                    stats["running"] -= 1
+                    stats["completed"] += 1
+
+        future = asyncio.get_running_loop().run_in_executor(self.pools[exec_class], job)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                stats["timeouts"] += 1
+                # Still queued: wait_for cancelled the pending future, so it will never run
+                if not state["started"]:
+                    stats["queued"] -= 1
+            return f"Error: Tool timed out after {timeout}s ({exec_class} pool)."
+
+    def get_stats(self):
+        with self._lock:
+            result = {}
+            for name, stats in self.stats.items():
+                started = stats["submitted"] - stats["queued"]
+                result[name] = {
+                    **stats,
+                    "workers": self.sizes[name],
+                    "wait_avg": stats["wait_total"] / started if started else 0.0,
+                }
+            return result
+
+    def shutdown(self):
+        for pool in self.pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+class WorkerCrashed(Exception):
+    pass
+
+
+class _SandboxWorker:
+    """One long-lived `python -m core.tool_worker` process."""
+
+    def __init__(self, memory_limit_mb):
+        self.memory_limit_mb = memory_limit_mb
+        self.proc = None
+
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def start(self):
+        env = dict(os.environ)
+        # BLAS/OpenMP reserve address space per thread at import (numpy, cv2); one thread keeps
+        # them inside the RLIMIT_AS limit, and the sandbox has a worker per CPU-bound call anyway
+        for name in ("OPENBLAS_NUM_THREADS", "OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+            env.setdefault(name, "1")
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "core.tool_worker", str(self.memory_limit_mb)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            cwd=os.getcwd(),
+            env=env,
+        )
+
+    def call(self, request, timeout):
+        """Blocking round-trip. Raises TimeoutError or WorkerCrashed."""
+        if not self.alive():
+            self.start()
+        proc = self.proc  # Captured: kill()/start() may replace self.proc meanwhile
+
+        try:
+            write_frame(proc.stdin, request)
+        except (BrokenPipeError, OSError) as e:
+            raise WorkerCrashed(f"worker exited: {e}")
+
+        deadline = time.monotonic() + timeout
+        header = self._read_exact(proc, HEADER.size, deadline)
+        (length,) = HEADER.unpack(header)
+        return pickle.loads(self._read_exact(proc, length, deadline))
+
+    def _read_exact(self, proc, size, deadline):
+        fd = proc.stdout.fileno()
+        chunks = []
+        remaining = size
+        while remaining:
+            wait = deadline - time.monotonic()
+            if wait <= 0:
+                raise TimeoutError()
+            ready, _, _ = select.select([fd], [], [], wait)
+            if not ready:
+                continue
+            chunk = os.read(fd, min(remaining, 1 << 16))
+            if not chunk:
+                raise WorkerCrashed(f"worker exited with code {proc.wait()}")
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
+
+    def kill(self):
+        proc = self.proc
+        self.proc = None
+        if proc is not None and proc.poll() is None:
+            proc.kill()
+            proc.wait()
+
+
+class ProcessSandbox:
+    """
+    Warm worker processes for CPU-heavy or crash-prone tools, so they don't
+    hold the bot's GIL while replies are streaming to other chats.
+
+    Each worker imports the tool's module by path and calls the function by
+    name; requests and results are pickled over the worker's pipes. Workers
+    run under an address-space limit: SANDBOX_MEMORY_MB, or the tool's own
+    memory_limit_mb, which gets its own set of workers. A call that crashes
+    its worker or runs past its timeout gets an error string back, and the
+    worker is killed and restarted on next use. Processes start on first use
+    and then stay warm.
+    """
+
+    def __init__(self, workers=None, memory_limit_mb=None, timeout=None):
+        self.enabled = getattr(config, "PROCESS_SANDBOX", True)
+        self.size = workers or getattr(config, "SANDBOX_WORKERS", 2)
+        self.memory_limit_mb = memory_limit_mb or getattr(config, "SANDBOX_MEMORY_MB", 1024)
+        self.timeout = timeout or DEFAULT_TIMEOUTS["cpu"]
+        self._workers = {}  # memory limit -> its workers, started on first use
+        self._idle = {}  # memory limit -> asyncio.Queue of idle workers, created inside the running loop
+        self.stats = {"calls": 0, "errors": 0, "crashes": 0, "timeouts": 0, "queued": 0}
+
+    def _queue(self, memory_limit_mb):
+        idle = self._idle.get(memory_limit_mb)
+        if idle is None:
+            workers = [_SandboxWorker(memory_limit_mb) for _ in range(self.size)]
+            self._workers[memory_limit_mb] = workers
+            idle = self._idle[memory_limit_mb] = asyncio.Queue()
+            for worker in workers:
+                idle.put_nowait(worker)
+        return idle
+
+    async def run(self, module_name, filepath, func_name, kwargs, timeout=None, memory_limit_mb=None):
+        idle = self._queue(memory_limit_mb or self.memory_limit_mb)
+        timeout = timeout or self.timeout
+        self.stats["queued"] += 1
+        try:
+            worker = await idle.get()
+        finally:
+            self.stats["queued"] -= 1
+
+        self.stats["calls"] += 1
+        try:
+            status, value = await asyncio.to_thread(
+                worker.call, (module_name, filepath, func_name, kwargs), timeout
+            )
+            if status != "ok":
+                self.stats["errors"] += 1
+            return value
+        except TimeoutError:
+            self.stats["timeouts"] += 1
+            worker.kill()
+            return f"Error: Tool '{func_name}' timed out after {timeout}s; its worker process was restarted."
+        except WorkerCrashed as e:
+            self.stats["crashes"] += 1
+            worker.kill()
+            return f"Error: Tool '{func_name}' crashed its worker process ({e}); the worker was restarted."
+        except asyncio.CancelledError:
+            # The thread may still be talking to this process: don't hand it to anyone else
+            worker.kill()
+            raise
+        finally:
+            idle.put_nowait(worker)
+
+    def _all_workers(self):
+        return [worker for workers in self._workers.values() for worker in workers]
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            "workers": self.size,
+            "memory_limits": sorted(self._workers),
+            "alive": sum(w.alive() for w in self._all_workers()),
+        }
+
+    def shutdown(self):
+        for worker in self._all_workers():
+            worker.kill()
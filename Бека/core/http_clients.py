@@ -0,0 +1,160 @@
+import threading
+import weakref
+import httpx
+import config
+
+try:
+    import h2  # noqa: F401 - enables HTTP/2 in httpx
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+PROVIDER_URLS = {
+    "groq": "https://api.groq.com/openai/v1",
+    "deepseek": "https://api.deepseek.com",
+}
+PROVIDER_KEYS = {
+    "groq": "GROQ_API_KEY",
+    "deepseek": "DEEPSEEK_API_KEY",
+}
+
+
+class _ConnectionStats:
+    """Counts requests and distinct TCP connections to tell how often connections are reused."""
+
+    def __init__(self):
+        self.requests = 0
+        self.connections = 0
+        self._seen = weakref.WeakSet()
+        self._seen_ids = set()
+        # Reentrant: the SDK client factories build their httpx client (and its stats) under the same lock
+        self._lock = threading.RLock()
+
+    def record(self, response):
+        stream = response.extensions.get("network_stream")
+        with self._lock:
+            self.requests += 1
+            if stream is None:
+                return
+            try:
+                if stream in self._seen:
+                    return
+                self._seen.add(stream)
+            except TypeError:
+                # Not weak-referenceable: fall back to ids (may undercount after reuse of an id)
+                if id(stream) in self._seen_ids:
+                    return
+                self._seen_ids.add(id(stream))
+            self.connections += 1
+
+    def snapshot(self):
+        with self._lock:
+            reused = self.requests - self.connections
+            return {
+                "requests": self.requests,
+                "connections": self.connections,
+                "reuse_ratio": reused / self.requests if self.requests else 0.0,
+            }
+
+
+class ClientPool:
+    """
+    Process-wide HTTP clients, one per provider and flavour (sync / async),
+    so every LLM, Whisper and vision call reuses warm keep-alive connections
+    (HTTP/2 when the `h2` package is installed) instead of paying a new TLS
+    handshake per request.
+
+    Limits come from config: HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE,
+    HTTP_KEEPALIVE_EXPIRY and HTTP2. Base URLs can be overridden per provider
+    with <PROVIDER>_BASE_URL (e.g. DEEPSEEK_BASE_URL for a local stub).
+    """
+
+    def __init__(self):
+        self.http2 = getattr(config, "HTTP2", True) and HTTP2_AVAILABLE
+        self.limits = httpx.Limits(
+            max_connections=getattr(config, "HTTP_MAX_CONNECTIONS", 20),
+            max_keepalive_connections=getattr(config, "HTTP_MAX_KEEPALIVE", 10),
+            keepalive_expiry=getattr(config, "HTTP_KEEPALIVE_EXPIRY", 60),
+        )
+        self.timeout = httpx.Timeout(getattr(config, "HTTP_TIMEOUT", 120), connect=10)
+        self._clients = {}
+        self._stats = {}
+        # Reentrant: the SDK client factories build their httpx client (and its stats) under the same lock
+        self._lock = threading.RLock()
+
+    def base_url(self, provider):
+        return getattr(config, f"{provider.upper()}_BASE_URL", None) or PROVIDER_URLS[provider]
+
+    def api_key(self, provider):
+        return getattr(config, PROVIDER_KEYS.get(provider, f"{provider.upper()}_API_KEY"), None)
+
+    def _stats_for(self, provider):
+        with self._lock:
+            if provider not in self._stats:
+                self._stats[provider] = _ConnectionStats()
+            return self._stats[provider]
+
+    def _get(self, key, factory):
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = factory()
+                    self._clients[key] = client
+        return client
+
+    def async_http(self, provider):
+        """Shared httpx.AsyncClient for a provider (use from the event loop)."""
+        stats = self._stats_for(provider)
+
+        async def on_response(response):
+            stats.record(response)
+
+        return self._get(("async_http", provider), lambda: httpx.AsyncClient(
+            http2=self.http2, limits=self.limits, timeout=self.timeout,
+            event_hooks={"response": [on_response]},
+        ))
+
+    def sync_http(self, provider):
+        """Shared, thread-safe httpx.Client for a provider (use from tool threads)."""
+        stats = self._stats_for(provider)
+        return self._get(("sync_http", provider), lambda: httpx.Client(
+            http2=self.http2, limits=self.limits, timeout=self.timeout,
+            event_hooks={"response": [stats.record]},
+        ))
+
+    def async_openai(self, provider):
+        from openai import AsyncOpenAI
+        return self._get(("async_openai", provider), lambda: AsyncOpenAI(
+            api_key=self.api_key(provider),
+            base_url=self.base_url(provider),
+            http_client=self.async_http(provider),
+            # Failover to another provider (core/router.py) beats retrying the same one
+            max_retries=getattr(config, "LLM_MAX_RETRIES", 1),
+        ))
+
+    def openai(self, provider):
+        from openai import OpenAI
+        return self._get(("openai", provider), lambda: OpenAI(
+            api_key=self.api_key(provider),
+            base_url=self.base_url(provider),
+            http_client=self.sync_http(provider),
+        ))
+
+    def groq(self):
+        """Shared native Groq SDK client (sync)."""
+        from groq import Groq
+        return self._get(("groq_sdk", "groq"), lambda: Groq(
+            api_key=self.api_key("groq"),
+            http_client=self.sync_http("groq"),
+        ))
+
+    def get_stats(self):
+        with self._lock:
+            providers = dict(self._stats)
+        return {provider: stats.snapshot() for provider, stats in providers.items()}
+
+
+# Singleton instance
+client_pool = ClientPool()
@@ -1,21 +1,48 @@
+import json
 import os
-from openai import AsyncOpenAI
 from typing import AsyncGenerator, Union, List, Dict, Any
 import config
+from core.http_clients import client_pool
+from core.router import LLMRouter
+from core.llm_scheduler import LLMScheduler
+from core.tokens import count_tokens, history_tokens, strip_private, usage_dict
 
 class LLMService:
     def __init__(self):
-        # Initialize Groq client
-        self.groq_client = AsyncOpenAI(
-            api_key=config.GROQ_API_KEY,
-            base_url="https://api.groq.com/openai/v1"
-        )
-
-        # Initialize DeepSeek client
-        self.deepseek_client = AsyncOpenAI(
-            api_key=config.DEEPSEEK_API_KEY,
-            base_url="https://api.deepseek.com"
-        )
+        # Shared pooled clients (keep-alive, HTTP/2 when available) behind the router
+        # Every request the router sends (fallbacks and hedges too) is admitted by the scheduler
+        self.scheduler = LLMScheduler()
+        self.router = LLMRouter(client_pool.async_openai, scheduler=self.scheduler)
+        # Provider-reported usage (stream include_usage), summed per provider
+        self.usage = {}
+
+    def connection_stats(self):
+        return client_pool.get_stats()
+
+    def router_stats(self):
+        return self.router.get_stats()
+
+    def scheduler_stats(self):
+        return self.scheduler.get_stats()
+
+    def usage_stats(self):
+        return {provider: dict(totals) for provider, totals in self.usage.items()}
+
+    @staticmethod
+    def estimate_request_tokens(messages, tools=None, tools_tokens=None):
+        """Prompt size for the scheduler. Pass `tools_tokens` when known: counting the definitions is costly."""
+        tokens = history_tokens(messages)
+        if tools_tokens is not None:
+            tokens += tools_tokens
+        elif tools:
+            tokens += count_tokens(json.dumps(tools, ensure_ascii=False, separators=(",", ":")))
+        return tokens
+
+    def _record_usage(self, provider, usage):
+        totals = self.usage.setdefault(provider, {"requests": 0})
+        totals["requests"] += 1
+        for key, value in usage.items():
+            totals[key] = totals.get(key, 0) + value
 
     async def generate(
         self,
@@ -25,47 +52,50 @@ class LLMService:
         temperature: float = 0.7,
         stream: bool = False,
         tools: List[Dict[str, Any]] = None,
+        chat_id=None,
+        priority: str = "interactive",
+        tools_tokens: int = None,
     ) -> Union[Any, AsyncGenerator[Any, None]]:
         """
-        Generates response via Groq or DeepSeek API.
+        Generates response via Groq or DeepSeek API, routed through LLMRouter
+        (failover to equivalent models, hedging of slow streams, circuit breaking).
         Returns message object (non-stream) or async generator of chunks (stream).
+
+        Requests first wait for a slot from LLMScheduler (provider RPM/TPM limits,
+        per-chat fairness); priority is "interactive", "summary" or "scheduled".
+        `tools_tokens` is the token count of `tools`, if the caller has it.
+        The router takes the slot under whichever provider it actually calls;
+        a stream holds its slot until it is exhausted or closed.
         """
         try:
-            client = self.groq_client
-            if provider == "deepseek":
-                client = self.deepseek_client
-                if model == "default":
-                    model = "deepseek-chat"
+            if provider == "deepseek" and model == "default":
+                model = "deepseek-chat"
 
-            tool_choice = "auto" if tools else None
+            request = {
+                "messages": [strip_private(m) for m in messages],
+                "temperature": temperature,
+                "tools": tools,
+                "tool_choice": "auto" if tools else None,
+            }
 
             if stream:
-                response = await client.chat.completions.create(
-                    model=model,
-                    messages=messages,
-                    temperature=temperature,
-                    stream=True,
-                    tools=tools,
-                    tool_choice=tool_choice
-                )
-
-                # Wrap generator to yield raw chunks
-                async def stream_generator() -> AsyncGenerator[Any, None]:
-                    async for chunk in response:
-                        yield chunk
-
-                return stream_generator()
-
-            else:
-                response = await client.chat.completions.create(
-                    model=model,
-                    messages=messages,
-                    temperature=temperature,
-                    stream=False,
-                    tools=tools,
-                    tool_choice=tool_choice
-                )
-                return response.choices[0].message
+                # Final chunk carries the real token counts (chunk.usage)
+                request["stream_options"] = {"include_usage": True}
+
+            admission = {
+                "chat_id": chat_id,
+                "priority": priority,
+                "tokens": self.estimate_request_tokens(messages, tools, tools_tokens),
+            }
+
+            if stream:
+                response = await self.router.stream(provider, model, admission=admission, **request)
+                return self._record_stream_usage(provider, response)
+
+            message, usage = await self.router.complete(provider, model, admission=admission, **request)
+            if usage:
+                self._record_usage(provider, usage)
+            return message
 
         except Exception as e:
             error_msg = f"Error generating response: {str(e)}"
@@ -74,3 +104,14 @@ class LLMService:
                     yield error_msg
                 return error_gen()
             return error_msg
+
+    async def _record_stream_usage(self, provider, stream_gen):
+        try:
+            async for chunk in stream_gen:
+                usage = usage_dict(getattr(chunk, "usage", None))
+                if usage:
+                    self._record_usage(provider, usage)
+                yield chunk
+        finally:
+            # Closing early must reach the router's relay, which releases the slot
+            await stream_gen.aclose()
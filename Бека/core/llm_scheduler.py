@@ -0,0 +1,219 @@
+import asyncio
+import itertools
+import time
+from collections import OrderedDict, deque
+import config
+
+# Lower runs first
+PRIORITIES = {"interactive": 0, "summary": 1, "scheduled": 2}
+DEFAULT_PRIORITY = "interactive"
+
+# Per-provider quotas: requests/minute, tokens/minute and simultaneous streams
+DEFAULT_LIMITS = {
+    "deepseek": {"rpm": 300, "tpm": 1000000, "concurrency": 16},
+    "groq": {"rpm": 30, "tpm": 12000, "concurrency": 8},
+}
+FALLBACK_LIMITS = {"rpm": 60, "tpm": 100000, "concurrency": 8}
+
+
+class TokenBucket:
+    """Refills `per_minute` units per minute, holding at most that many."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until `amount` is available (0 when it already is)."""
+        self._refill()
+        amount = min(amount, self.capacity)  # Oversized requests just need a full bucket
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount):
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+    def refund(self, amount):
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+
+class _Ticket:
+    __slots__ = ("chat_id", "priority", "tokens", "future", "enqueued", "seq")
+
+    def __init__(self, chat_id, priority, tokens, future, seq):
+        self.chat_id = chat_id
+        self.priority = priority
+        self.tokens = tokens
+        self.future = future
+        self.enqueued = time.monotonic()
+        self.seq = seq
+
+
+class _ProviderQueue:
+    """Waiting requests of one provider: per priority, a round-robin of per-chat FIFOs."""
+
+    def __init__(self, limits):
+        self.rpm = TokenBucket(limits["rpm"])
+        self.tpm = TokenBucket(limits["tpm"])
+        self.concurrency = limits["concurrency"]
+        self.active = 0
+        self.levels = {level: OrderedDict() for level in sorted(set(PRIORITIES.values()))}
+        self.timer = None
+        self.stats = {"granted": 0, "queued": 0, "wait_total": 0.0, "wait_max": 0.0, "throttled": 0}
+
+    def push(self, ticket):
+        chats = self.levels[ticket.priority]
+        chats.setdefault(ticket.chat_id, deque()).append(ticket)
+        self.stats["queued"] += 1
+
+    def head(self):
+        """Next ticket in line: best priority, then the chat whose turn it is."""
+        for chats in self.levels.values():
+            while chats:
+                chat_id, tickets = next(iter(chats.items()))
+                while tickets and tickets[0].future.done():  # Cancelled while waiting
+                    tickets.popleft()
+                    self.stats["queued"] -= 1
+                if tickets:
+                    return tickets[0]
+                del chats[chat_id]
+        return None
+
+    def pop(self, ticket):
+        chats = self.levels[ticket.priority]
+        tickets = chats.pop(ticket.chat_id)
+        tickets.popleft()
+        if tickets:
+            chats[ticket.chat_id] = tickets  # Back of the rotation: the next chat goes first
+        self.stats["queued"] -= 1
+
+
+class LLMScheduler:
+    """
+    Admission control in front of the LLM providers.
+
+    Each provider has an RPM and a TPM token bucket plus a cap on concurrent
+    streams (LLM_RATE_LIMITS in config, e.g. {"groq": {"rpm": 30, "tpm":
+    12000, "concurrency": 8}}). Requests that don't fit wait in line:
+    interactive turns before summaries before scheduled jobs, and within a
+    priority the chats take turns, so one chat sending a burst can't hold up
+    everyone else.
+
+    Token cost is an estimate when the request is admitted; settle() corrects
+    the TPM bucket with the real usage once it is known.
+    """
+
+    def __init__(self, limits=None):
+        configured = limits or getattr(config, "LLM_RATE_LIMITS", {})
+        self.limits = {**DEFAULT_LIMITS, **configured}
+        self.expected_output = getattr(config, "LLM_EXPECTED_OUTPUT_TOKENS", 500)
+        self.providers = {}
+        self._seq = itertools.count()
+
+    def _queue(self, provider):
+        if provider not in self.providers:
+            limits = {**FALLBACK_LIMITS, **self.limits.get(provider, {})}
+            self.providers[provider] = _ProviderQueue(limits)
+        return self.providers[provider]
+
+    async def acquire(self, provider, chat_id=None, priority=DEFAULT_PRIORITY, tokens=0):
+        """
+        Waits for the provider's turn. Returns a permit to pass to release().
+        `tokens` is the estimated prompt size; expected output is added on top.
+        """
+        queue = self._queue(provider)
+        level = PRIORITIES.get(priority, PRIORITIES[DEFAULT_PRIORITY])
+        cost = tokens + self.expected_output
+        future = asyncio.get_running_loop().create_future()
+        ticket = _Ticket(chat_id, level, cost, future, next(self._seq))
+        queue.push(ticket)
+        self._pump(provider)
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as we were cancelled: hand the slot back
+                self.release((provider, cost))
+            raise
+        return (provider, cost)
+
+    def try_acquire(self, provider, chat_id=None, priority=DEFAULT_PRIORITY, tokens=0):
+        """
+        A permit if the provider has room right now (a free slot, RPM and TPM
+        budget, nobody waiting), else None. For optional extra requests such as
+        hedges, which are only worth sending if they don't have to wait.
+        """
+        queue = self._queue(provider)
+        cost = tokens + self.expected_output
+        if queue.active >= queue.concurrency or queue.head() is not None:
+            return None
+        if queue.rpm.wait_time(1) > 0 or queue.tpm.wait_time(cost) > 0:
+            return None
+        queue.rpm.take(1)
+        queue.tpm.take(cost)
+        queue.active += 1
+        queue.stats["granted"] += 1
+        return (provider, cost)
+
+    def release(self, permit, actual_tokens=None):
+        """Frees the concurrency slot; with actual_tokens, settles the TPM estimate."""
+        provider, cost = permit
+        queue = self._queue(provider)
+        queue.active -= 1
+        if actual_tokens is not None:
+            self.settle(provider, cost, actual_tokens)
+        self._pump(provider)
+
+    def settle(self, provider, estimated, actual):
+        queue = self._queue(provider)
+        if actual < estimated:
+            queue.tpm.refund(estimated - actual)
+        elif actual > estimated:
+            queue.tpm.take(actual - estimated)
+
+    def _pump(self, provider):
+        queue = self._queue(provider)
+        if queue.timer is not None:
+            queue.timer.cancel()
+            queue.timer = None
+
+        while queue.active < queue.concurrency:
+            ticket = queue.head()
+            if ticket is None:
+                return
+            wait = max(queue.rpm.wait_time(1), queue.tpm.wait_time(ticket.tokens))
+            if wait > 0:
+                queue.stats["throttled"] += 1
+                loop = asyncio.get_running_loop()
+                queue.timer = loop.call_later(wait, self._pump, provider)
+                return
+
+            queue.pop(ticket)
+            queue.rpm.take(1)
+            queue.tpm.take(ticket.tokens)
+            queue.active += 1
+            waited = time.monotonic() - ticket.enqueued
+            queue.stats["granted"] += 1
+            queue.stats["wait_total"] += waited
+            queue.stats["wait_max"] = max(queue.stats["wait_max"], waited)
+            ticket.future.set_result(None)
+
+    def get_stats(self):
+        result = {}
+        for provider, queue in self.providers.items():
+            stats = dict(queue.stats)
+            stats["active"] = queue.active
+            stats["wait_avg"] = stats["wait_total"] / stats["granted"] if stats["granted"] else 0.0
+            stats["rpm_available"] = round(queue.rpm.level, 1)
+            stats["tpm_available"] = round(queue.tpm.level)
+            result[provider] = stats
+        return result
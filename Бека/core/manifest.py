@@ -0,0 +1,186 @@
+import ast
+import glob
+import inspect
+import json
+import os
+
+MANIFEST_VERSION = 1
+
+# Annotations get_definitions() understands; anything else is treated as a string
+ANNOTATIONS = {"int": int, "float": float, "bool": bool, "list": list, "dict": dict, "str": str}
+
+# Stands in for defaults that are not literals; only "has a default" matters for the schema
+NON_LITERAL_DEFAULT = "<default>"
+
+
+def _literal(node):
+    return ast.literal_eval(node)
+
+
+def _param_specs(func_node):
+    args = func_node.args
+    specs = []
+
+    positional = args.posonlyargs + args.args
+    defaults = [None] * (len(positional) - len(args.defaults)) + list(args.defaults)
+    kinds = [inspect.Parameter.POSITIONAL_ONLY] * len(args.posonlyargs)
+    kinds += [inspect.Parameter.POSITIONAL_OR_KEYWORD] * len(args.args)
+    for arg, default, kind in zip(positional, defaults, kinds):
+        specs.append(_param_spec(arg, default, kind))
+
+    if args.vararg:
+        specs.append({"name": args.vararg.arg, "kind": int(inspect.Parameter.VAR_POSITIONAL)})
+    for arg, default in zip(args.kwonlyargs, args.kw_defaults):
+        specs.append(_param_spec(arg, default, inspect.Parameter.KEYWORD_ONLY))
+    if args.kwarg:
+        specs.append({"name": args.kwarg.arg, "kind": int(inspect.Parameter.VAR_KEYWORD)})
+    return specs
+
+
+def _param_spec(arg, default, kind):
+    spec = {"name": arg.arg, "kind": int(kind)}
+    if isinstance(arg.annotation, ast.Name) and arg.annotation.id in ANNOTATIONS:
+        spec["annotation"] = arg.annotation.id
+    if default is not None:
+        try:
+            value = _literal(default)
+            json.dumps(value)
+            spec["default"] = value
+        except (ValueError, TypeError, SyntaxError):
+            spec["default"] = NON_LITERAL_DEFAULT
+    return spec
+
+
+def build_signature(params):
+    """Rebuilds an inspect.Signature from a manifest parameter list."""
+    parameters = []
+    for spec in params:
+        parameters.append(inspect.Parameter(
+            spec["name"],
+            inspect._ParameterKind(spec["kind"]),
+            default=spec.get("default", inspect.Parameter.empty),
+            annotation=ANNOTATIONS.get(spec.get("annotation"), inspect.Parameter.empty),
+        ))
+    return inspect.Signature(parameters)
+
+
+def scan_module(filepath):
+    """
+    Reads a module's tool registrations without importing it.
+
+    Returns a list of tool specs, [] when the module has no register_tools(),
+    or None when the registrations can't be resolved statically (computed
+    names, helper calls, ...) and the module has to be imported.
+    """
+    with open(filepath, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=filepath)
+
+    functions = {}
+    register_tools = None
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            functions[node.name] = node
+            if node.name == "register_tools":
+                register_tools = node
+
+    if register_tools is None:
+        return []
+    if not register_tools.args.args:
+        return None
+    registry_name = register_tools.args.args[0].arg
+
+    tools = []
+    for stmt in register_tools.body:
+        # Docstring
+        if isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Constant) and isinstance(stmt.value.value, str):
+            continue
+        if not (isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Call)):
+            return None
+        call = stmt.value
+        if not (
+            isinstance(call.func, ast.Attribute)
+            and call.func.attr == "register"
+            and isinstance(call.func.value, ast.Name)
+            and call.func.value.id == registry_name
+        ):
+            return None
+
+        args = list(call.args)
+        if len(args) < 2 or not isinstance(args[1], ast.Name) or args[1].id not in functions:
+            return None
+        if any(kw.arg is None for kw in call.keywords):
+            return None  # **kwargs splat
+
+        try:
+            name = _literal(args[0])
+            description = _literal(args[2]) if len(args) > 2 else None
+            options = {kw.arg: _literal(kw.value) for kw in call.keywords}
+            if len(args) > 3:
+                options["requires_context"] = _literal(args[3])
+        except (ValueError, TypeError, SyntaxError):
+            return None
+        description = options.pop("description", description)
+        if not isinstance(name, str) or not isinstance(description, str):
+            return None
+
+        func_node = functions[args[1].id]
+        tools.append({
+            "name": name,
+            "func_name": func_node.name,
+            "description": description,
+            "is_async": isinstance(func_node, ast.AsyncFunctionDef),
+            "params": _param_specs(func_node),
+            "options": options,
+        })
+    return tools
+
+
+def load_manifest(modules_dir, manifest_path):
+    """
+    Scans every module in modules_dir, reusing cached entries for files whose
+    size and mtime haven't changed. Returns {module_name: entry}, where
+    entry["tools"] is the scan_module() result.
+    """
+    cached = {}
+    if manifest_path and os.path.exists(manifest_path):
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                cached = data.get("modules", {})
+        except Exception:
+            cached = {}
+
+    manifest = {}
+    changed = False
+    for filepath in sorted(glob.glob(os.path.join(modules_dir, "*.py"))):
+        module_name = os.path.basename(filepath)[:-3]
+        if module_name == "__init__":
+            continue
+
+        stat = os.stat(filepath)
+        entry = cached.get(module_name)
+        if entry and entry.get("mtime") == stat.st_mtime and entry.get("size") == stat.st_size:
+            manifest[module_name] = entry
+            continue
+
+        try:
+            tools = scan_module(filepath)
+        except SyntaxError:
+            tools = None
+        manifest[module_name] = {"path": filepath, "mtime": stat.st_mtime, "size": stat.st_size, "tools": tools}
+        changed = True
+
+    if manifest_path and (changed or set(manifest) != set(cached)):
+        try:
+            directory = os.path.dirname(manifest_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            tmp_path = manifest_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": MANIFEST_VERSION, "modules": manifest}, f, ensure_ascii=False)
+            os.replace(tmp_path, manifest_path)
+        except Exception as e:
+            print(f"Could not write tool manifest {manifest_path}: {e}")
+
+    return manifest
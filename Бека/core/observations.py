@@ -0,0 +1,209 @@
+import itertools
+import os
+import re
+import uuid
+import config
+from core.retrieval import BM25Index
+from core.tokens import count_tokens
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+
+
+class ObservationReducer:
+    """
+    Fits a large tool result into a token budget by relevance instead of
+    cutting it at a fixed length.
+
+    The text is split into chunks of about OBSERVATION_CHUNK_CHARS characters
+    on paragraph and line boundaries. The chunks are ranked with BM25 against
+    the user's request and the tool call's arguments, and the best ones are
+    kept until OBSERVATION_TOKEN_BUDGET is used up. The first chunk gets a
+    small bonus, because it usually holds the title or column headers. Kept
+    chunks stay in their original order and gaps are marked with "[...]".
+    When nothing matches the query, the result is the head of the text, as
+    with the old crop.
+    """
+
+    LEAD_BONUS = 0.5
+
+    def __init__(self, budget=None, chunk_chars=None):
+        self.budget = budget or getattr(config, "OBSERVATION_TOKEN_BUDGET", 700)
+        self.chunk_chars = chunk_chars or getattr(config, "OBSERVATION_CHUNK_CHARS", 600)
+        self.stats = {"observations": 0, "reduced": 0, "tokens_in": 0, "tokens_out": 0}
+
+    def chunk(self, text):
+        """Splits text into pieces of at most chunk_chars, preferring paragraph, then line breaks."""
+        chunks = []
+        for paragraph in _PARAGRAPH_RE.split(text):
+            if not paragraph.strip():
+                continue
+            if len(paragraph) <= self.chunk_chars:
+                chunks.append(paragraph)
+                continue
+            current = ""
+            for line in paragraph.split("\n"):
+                # A single huge line (minified JSON, HTML dump): cut at spaces where possible
+                while len(line) > self.chunk_chars:
+                    cut = line.rfind(" ", 0, self.chunk_chars)
+                    if cut <= self.chunk_chars // 2:
+                        cut = self.chunk_chars
+                    if current:
+                        chunks.append(current)
+                        current = ""
+                    chunks.append(line[:cut])
+                    line = line[cut:].lstrip(" ")
+                if current and len(current) + 1 + len(line) > self.chunk_chars:
+                    chunks.append(current)
+                    current = ""
+                current = f"{current}\n{line}" if current else line
+            if current.strip():
+                chunks.append(current)
+        return chunks
+
+    def reduce(self, text, query, budget=None):
+        """Returns `text` unchanged if it fits the budget, else its most relevant chunks."""
+        text = str(text)
+        budget = budget or self.budget
+        self.stats["observations"] += 1
+        tokens_in = count_tokens(text)
+        self.stats["tokens_in"] += tokens_in
+        if tokens_in <= budget:
+            self.stats["tokens_out"] += tokens_in
+            return text
+
+        chunks = self.chunk(text)
+        sizes = [count_tokens(chunk) for chunk in chunks]
+        scores = BM25Index(chunks).scores(query or "")
+        if scores:
+            scores[0] += self.LEAD_BONUS
+        # Best first; equal scores keep document order, so an unmatched query keeps the head
+        ranked = sorted(range(len(chunks)), key=lambda i: (-scores[i], i))
+
+        # Room for the header and the gap markers
+        remaining = budget - 30
+        kept = set()
+        for i in ranked:
+            if sizes[i] + 2 <= remaining:
+                kept.add(i)
+                remaining -= sizes[i] + 2
+
+        parts = []
+        previous = -1
+        for i in sorted(kept):
+            if i != previous + 1:
+                parts.append("[...]")
+            parts.append(chunks[i])
+            previous = i
+        if previous != len(chunks) - 1:
+            parts.append("[...]")
+
+        result = (
+            f"[Showing {len(kept)} of {len(chunks)} parts most relevant to the request, "
+            f"~{sum(sizes[i] for i in kept)} of {tokens_in} tokens]\n" + "\n".join(parts)
+        )
+        self.stats["reduced"] += 1
+        self.stats["tokens_out"] += count_tokens(result)
+        return result
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["tokens_saved"] = stats["tokens_in"] - stats["tokens_out"]
+        return stats
+
+
+class ObservationStore:
+    """
+    Full text of the tool results that were too large for the prompt, kept
+    for one agent run so the model can page through them with
+    read_observation(handle, offset, length) instead of calling the tool again.
+
+    Results are held in memory up to OBSERVATION_MEMORY_CHARS in total; past
+    that the oldest ones are spilled to OBSERVATION_SPILL_DIR. close() drops
+    everything, including the spilled files, when the run ends.
+    """
+
+    def __init__(self, memory_chars=None, spill_dir=None, page_chars=None):
+        self.memory_chars = memory_chars or getattr(config, "OBSERVATION_MEMORY_CHARS", 200_000)
+        self.spill_dir = spill_dir or getattr(config, "OBSERVATION_SPILL_DIR", "data/observations")
+        self.page_chars = page_chars or getattr(config, "OBSERVATION_PAGE_CHARS", 2000)
+        self.run_id = uuid.uuid4().hex[:12]
+        self._counter = itertools.count(1)
+        self._entries = {}  # handle -> {"tool", "length", "text" or "path"}
+        self._in_memory = 0
+        self.stats = {"stored": 0, "spilled": 0, "reads": 0, "chars_read": 0}
+
+    def put(self, tool_name, text):
+        """Stores one result and returns its handle."""
+        text = str(text)
+        handle = f"obs-{next(self._counter)}"
+        self._entries[handle] = {"tool": tool_name, "length": len(text), "text": text}
+        self._in_memory += len(text)
+        self.stats["stored"] += 1
+        self._spill()
+        return handle
+
+    def _spill(self):
+        for handle, entry in self._entries.items():
+            if self._in_memory <= self.memory_chars:
+                return
+            if "text" not in entry:
+                continue
+            path = os.path.join(self.spill_dir, f"{self.run_id}-{handle}.txt")
+            try:
+                os.makedirs(self.spill_dir, exist_ok=True)
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(entry["text"])
+            except OSError as e:
+                print(f"Error spilling observation {handle}: {e}")
+                return
+            self._in_memory -= entry["length"]
+            entry["path"] = path
+            del entry["text"]
+            self.stats["spilled"] += 1
+
+    def describe(self, handle):
+        entry = self._entries[handle]
+        return (
+            f'[Full output of {entry["tool"]}: {entry["length"]} characters, stored as "{handle}". '
+            f'Read more with read_observation(handle="{handle}", offset, length).]'
+        )
+
+    def read(self, handle, offset=0, length=None):
+        """One page of a stored result, with a note on where it sits in the whole."""
+        entry = self._entries.get(str(handle).strip())
+        if entry is None:
+            known = ", ".join(self._entries) or "none"
+            return f"Error: Unknown observation handle '{handle}'. Available: {known}."
+        try:
+            offset = max(int(offset or 0), 0)
+            length = int(length or self.page_chars)
+        except (TypeError, ValueError):
+            return "Error: offset and length must be integers."
+        length = min(max(length, 1), self.page_chars * 4)
+
+        if "text" in entry:
+            page = entry["text"][offset:offset + length]
+        else:
+            try:
+                with open(entry["path"], "r", encoding="utf-8") as f:
+                    page = f.read(offset + length)[offset:]
+            except OSError as e:
+                return f"Error reading observation {handle}: {e}"
+
+        end = offset + len(page)
+        self.stats["reads"] += 1
+        self.stats["chars_read"] += len(page)
+        note = f"[{handle}: characters {offset}-{end} of {entry['length']}"
+        note += f"; next offset {end}]" if end < entry["length"] else "; end]"
+        return f"{note}\n{page}"
+
+    def close(self):
+        for entry in self._entries.values():
+            path = entry.get("path")
+            if path:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        self._entries.clear()
+        self._in_memory = 0
@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+import config
+from core.sessions import ChatLocks
+
+# Endpoints that put something in a chat; everything else (getFile, getUpdates, ...) passes straight through
+PACED_ENDPOINTS = {
+    "sendMessage", "editMessageText", "editMessageCaption", "editMessageMedia", "editMessageReplyMarkup",
+    "sendDocument", "sendPhoto", "sendVideo", "sendAudio", "sendVoice", "sendAnimation", "sendVideoNote",
+    "sendMediaGroup", "sendLocation", "sendContact", "sendPoll", "sendSticker", "sendDice",
+    "copyMessage", "forwardMessage", "deleteMessage",
+}
+CHAT_ACTION_TTL = 4.5  # Telegram shows "typing..." for about 5 seconds
+
+
+class TelegramOutbox(BaseRateLimiter):
+    """
+    Paces every outgoing Bot API call (installed with ApplicationBuilder().rate_limiter()),
+    so handlers, tools and job callbacks all share one set of flood limits:
+
+    - at most TELEGRAM_GLOBAL_RATE calls per second overall (default 30);
+    - one message per TELEGRAM_CHAT_INTERVAL seconds per chat (default 1.0),
+      TELEGRAM_GROUP_INTERVAL in groups (default 3.0, i.e. 20/min); calls to
+      one chat go out in order;
+    - an edit of a message that already has an edit waiting replaces it: only
+      the newest text is sent, and both callers get its result;
+    - a chat action repeated while the previous one is still showing is
+      dropped;
+    - on RetryAfter every call waits out retry_after and is retried, up to
+      TELEGRAM_MAX_RETRIES times.
+
+    get_stats() counts the API calls saved by merging and dropping.
+    """
+
+    def __init__(self):
+        self.global_rate = getattr(config, "TELEGRAM_GLOBAL_RATE", 30)
+        self.chat_interval = getattr(config, "TELEGRAM_CHAT_INTERVAL", 1.0)
+        self.group_interval = getattr(config, "TELEGRAM_GROUP_INTERVAL", 3.0)
+        self.max_retries = getattr(config, "TELEGRAM_MAX_RETRIES", 3)
+        self._sent = deque()  # Monotonic times of calls in the last second
+        self._global_lock = asyncio.Lock()
+        self._paused_until = 0.0
+        self._chat_locks = ChatLocks()
+        self._chat_next = {}  # chat_id -> earliest monotonic time for its next message
+        self._chat_actions = {}  # chat_id -> (action, monotonic time sent)
+        self._edits = {}  # (chat_id, message_id) -> newest pending edit
+        self.stats = {
+            "requests": 0, "sent": 0, "merged_edits": 0, "dropped_actions": 0,
+            "retry_after": 0, "queued": 0, "paced": 0, "wait_total": 0.0, "wait_max": 0.0,
+        }
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        logging.info(f"Telegram outbox: {self.get_stats()}")
+
+    def _interval(self, chat_id):
+        try:
+            return self.group_interval if int(chat_id) < 0 else self.chat_interval
+        except (TypeError, ValueError):
+            return self.chat_interval  # @channelusername
+
+    async def _global_slot(self):
+        async with self._global_lock:
+            while True:
+                now = time.monotonic()
+                while self._sent and now - self._sent[0] >= 1.0:
+                    self._sent.popleft()
+                wait = self._paused_until - now
+                if len(self._sent) >= self.global_rate:
+                    wait = max(wait, 1.0 - (now - self._sent[0]))
+                if wait <= 0:
+                    self._sent.append(now)
+                    return
+                await asyncio.sleep(wait)
+
+    async def _call(self, callback, args, kwargs, chat_id=None):
+        for attempt in range(self.max_retries + 1):
+            await self._global_slot()
+            try:
+                result = await callback(*args, **kwargs)
+                self.stats["sent"] += 1
+                return result
+            except RetryAfter as e:
+                self.stats["retry_after"] += 1
+                retry_after = e.retry_after
+                seconds = retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+                if attempt >= self.max_retries:
+                    raise
+                logging.warning(f"Telegram flood limit (chat {chat_id}): retrying in {seconds:.1f}s")
+                self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+                if chat_id is not None:
+                    self._chat_next[chat_id] = max(self._chat_next.get(chat_id, 0.0), time.monotonic() + seconds)
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get("chat_id")
+        if chat_id is None or (endpoint not in PACED_ENDPOINTS and endpoint != "sendChatAction"):
+            return await callback(*args, **kwargs)
+
+        self.stats["requests"] += 1
+        if endpoint == "sendChatAction":
+            return await self._chat_action(callback, args, kwargs, chat_id, data.get("action"))
+
+        edit = None
+        if endpoint == "editMessageText" and data.get("message_id") is not None:
+            edit = self._register_edit((chat_id, data["message_id"]))
+
+        enqueued = time.monotonic()
+        self.stats["queued"] += 1
+        lock = self._chat_locks.get(chat_id)
+        try:
+            async with lock:
+                wait = self._chat_next.get(chat_id, 0.0) - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                superseded = edit is not None and edit["superseded_by"] is not None
+                if not superseded:
+                    waited = time.monotonic() - enqueued
+                    self.stats["paced"] += 1
+                    self.stats["wait_total"] += waited
+                    self.stats["wait_max"] = max(self.stats["wait_max"], waited)
+                    if edit is not None:
+                        edit["sending"] = True
+                    try:
+                        result = await self._call(callback, args, kwargs, chat_id)
+                    except BaseException as e:
+                        if edit is not None:
+                            self._finish_edit(edit, error=e)
+                        raise
+                    finally:
+                        self._chat_next[chat_id] = time.monotonic() + self._interval(chat_id)
+                    if edit is not None:
+                        self._finish_edit(edit, result=result)
+                    return result
+        finally:
+            self.stats["queued"] -= 1
+
+        # Merged into a newer edit of the same message: its result is ours
+        if superseded:
+            newest = edit
+            while newest["superseded_by"] is not None:
+                newest = newest["superseded_by"]
+            return await asyncio.shield(newest["done"])
+
+    def _register_edit(self, key):
+        edit = {
+            "key": key,
+            "superseded_by": None,
+            "sending": False,
+            "done": asyncio.get_running_loop().create_future(),
+        }
+        # Nobody may await a merged edit's result; don't warn about unretrieved errors
+        edit["done"].add_done_callback(lambda f: f.cancelled() or f.exception())
+        older = self._edits.get(key)
+        if older is not None and not older["sending"]:
+            older["superseded_by"] = edit
+            self.stats["merged_edits"] += 1
+        self._edits[key] = edit
+        return edit
+
+    def _finish_edit(self, edit, result=None, error=None):
+        if self._edits.get(edit["key"]) is edit:
+            del self._edits[edit["key"]]
+        if edit["done"].done():
+            return
+        if isinstance(error, asyncio.CancelledError):
+            edit["done"].cancel()
+        elif error is not None:
+            edit["done"].set_exception(error)
+        else:
+            edit["done"].set_result(result)
+
+    async def _chat_action(self, callback, args, kwargs, chat_id, action):
+        last = self._chat_actions.get(chat_id)
+        now = time.monotonic()
+        if last and last[0] == action and now - last[1] < CHAT_ACTION_TTL:
+            self.stats["dropped_actions"] += 1
+            return True
+        self._chat_actions[chat_id] = (action, now)
+        # Chat actions don't count against the per-chat message limit
+        return await self._call(callback, args, kwargs, chat_id)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["saved_calls"] = stats["merged_edits"] + stats["dropped_actions"]
+        stats["wait_avg"] = stats["wait_total"] / stats["paced"] if stats["paced"] else 0.0
+        return stats
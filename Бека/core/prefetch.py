@@ -0,0 +1,107 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+import config
+
+DEFAULT_TTLS = {"time": 30, "profile": 60, "memory": 120}
+
+
+class ContextPrefetcher:
+    """
+    Gathers what the model used to fetch with tools at the start of every
+    conversation (Irkutsk time, the chat's profile, relevant memory) in
+    parallel, and renders it as a compact [Context] block for the prompt.
+
+    Each source is cached with a short TTL (PREFETCH_TTLS, seconds); a source
+    that fails is left out of the block rather than failing the turn. The
+    cache holds at most PREFETCH_CACHE_SIZE entries (least recently used go
+    first) and expired ones are dropped whenever a new one is stored.
+
+    Helpers from modules/ are called through the registry's loaded modules,
+    so a module reload applies here too.
+    """
+
+    def __init__(self, registry, max_entries=None):
+        self.registry = registry
+        self.ttls = {**DEFAULT_TTLS, **getattr(config, "PREFETCH_TTLS", {})}
+        self.memory_hits = getattr(config, "PREFETCH_MEMORY_HITS", 3)
+        self.max_entries = max_entries or getattr(config, "PREFETCH_CACHE_SIZE", 256)
+        self._cache = OrderedDict()  # (source, key) -> (expires, value)
+        self.stats = {"builds": 0, "hits": 0, "misses": 0, "errors": 0, "evictions": 0}
+
+    async def _cached(self, source, key, fetch):
+        entry = self._cache.get((source, key))
+        now = time.monotonic()
+        if entry and entry[0] > now:
+            self._cache.move_to_end((source, key))
+            self.stats["hits"] += 1
+            return entry[1]
+
+        self.stats["misses"] += 1
+        try:
+            value = await asyncio.to_thread(fetch)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logging.warning(f"Context prefetch '{source}' failed: {e}")
+            return None
+        self._store((source, key), (now + self.ttls.get(source, 60), value))
+        return value
+
+    def _store(self, cache_key, entry):
+        now = time.monotonic()
+        for expired in [k for k, (expires, _) in self._cache.items() if expires <= now]:
+            del self._cache[expired]
+        self._cache[cache_key] = entry
+        self._cache.move_to_end(cache_key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _fetch_time(self):
+        now = self.registry.get_module("irkutsk_time").get_irkutsk_time()
+        return f"{now['date']} {now['time'][:5]} {now['day_of_week']} (Irkutsk, {now['irkutsk_tz']})"
+
+    def _fetch_profile(self, chat_id):
+        profile = self.registry.get_module("profile").load_profiles().get(str(chat_id), {})
+        return json.dumps(profile, ensure_ascii=False, separators=(",", ":")) if profile else None
+
+    def _fetch_memory(self, query):
+        # Imported on first use: ChromaDB start-up is slow and lazy module loading defers it too
+        from core.memory_rag import memory_instance
+        if not memory_instance.enabled:
+            return None
+        return memory_instance.search(query, n_results=self.memory_hits) or None
+
+    async def gather(self, chat_id, query):
+        """Returns {"time", "profile", "memory"}; missing or failed sources are None."""
+        query = (query or "").strip()[:500]
+        tasks = [self._cached("time", None, self._fetch_time)]
+        tasks.append(self._cached("profile", str(chat_id), lambda: self._fetch_profile(chat_id)) if chat_id else _none())
+        tasks.append(self._cached("memory", query.lower(), lambda: self._fetch_memory(query)) if query else _none())
+        current_time, profile, memory = await asyncio.gather(*tasks)
+        return {"time": current_time, "profile": profile, "memory": memory}
+
+    async def build(self, chat_id, query):
+        """The [Context] block for this turn, or "" when nothing is available."""
+        self.stats["builds"] += 1
+        return self.format_block(await self.gather(chat_id, query))
+
+    @staticmethod
+    def format_block(parts):
+        lines = []
+        if parts.get("time"):
+            lines.append(f"Now: {parts['time']}")
+        if parts.get("profile"):
+            lines.append(f"Profile: {parts['profile']}")
+        if parts.get("memory"):
+            lines.append("Memory:")
+            lines.extend(f"- {fact}" for fact in parts["memory"])
+        if not lines:
+            return ""
+        return "[Context]\n" + "\n".join(lines)
+
+
+async def _none():
+    return None
@@ -0,0 +1,58 @@
+import math
+import re
+from collections import Counter
+
+# Letters/digits only, so tool names like get_weather split into words
+TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+def tokenize(text, stem_length=5):
+    """
+    Lowercase word tokens. Long words are cut to their first `stem_length`
+    characters, a crude stemmer that is good enough for Russian inflections
+    (расписание / расписанию) and English plurals alike.
+    """
+    tokens = []
+    for word in TOKEN_RE.findall(str(text).lower()):
+        if stem_length and len(word) > stem_length:
+            word = word[:stem_length]
+        tokens.append(word)
+    return tokens
+
+
+class BM25Index:
+    """Okapi BM25 over a small, static list of documents."""
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_freqs = [Counter(tokenize(doc)) for doc in documents]
+        self.doc_lengths = [sum(freqs.values()) for freqs in self.doc_freqs]
+        self.avg_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 0.0
+
+        df = Counter()
+        for freqs in self.doc_freqs:
+            df.update(freqs.keys())
+        n = len(self.doc_freqs)
+        self.idf = {term: math.log(1 + (n - count + 0.5) / (count + 0.5)) for term, count in df.items()}
+
+    def scores(self, query):
+        terms = [t for t in tokenize(query) if t in self.idf]
+        result = []
+        for freqs, length in zip(self.doc_freqs, self.doc_lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / self.avg_length) if self.avg_length else self.k1
+            for term in terms:
+                tf = freqs.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            result.append(score)
+        return result
+
+    def top(self, query, k):
+        """Indices of the k best-matching documents (score > 0), best first."""
+        ranked = sorted(
+            ((score, i) for i, score in enumerate(self.scores(query)) if score > 0),
+            key=lambda item: (-item[0], item[1]),
+        )
+        return [i for _, i in ranked[:k]]
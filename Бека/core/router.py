@@ -0,0 +1,312 @@
+import asyncio
+import logging
+import statistics
+import time
+from collections import deque
+import config
+from core.tokens import usage_dict
+
+# Interchangeable models, tried in order when a target is slow or its breaker is open
+DEFAULT_EQUIVALENTS = {
+    "deepseek:deepseek-chat": ["groq:llama-3.3-70b-versatile"],
+    "groq:llama3-70b-8192": ["groq:llama-3.3-70b-versatile", "deepseek:deepseek-chat"],
+    "groq:llama-3.3-70b-versatile": ["deepseek:deepseek-chat"],
+}
+
+WINDOW = 50  # Requests kept per target for the rolling TTFT / error rate
+
+
+class TargetHealth:
+    """Rolling latency and error stats for one provider:model, plus its circuit breaker."""
+
+    def __init__(self, failure_threshold, cooldown):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.ttfts = deque(maxlen=WINDOW)
+        self.outcomes = deque(maxlen=WINDOW)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.counts = {"requests": 0, "failures": 0, "wins": 0, "breaker_trips": 0}
+        self.last_error = None
+
+    def available(self, now=None):
+        # Half-open after the cooldown: the next request is the trial
+        return (now or time.monotonic()) >= self.open_until
+
+    def success(self, ttft=None):
+        self.counts["requests"] += 1
+        self.outcomes.append(True)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        if ttft is not None:
+            self.ttfts.append(ttft)
+
+    def failure(self, error):
+        self.counts["requests"] += 1
+        self.counts["failures"] += 1
+        self.outcomes.append(False)
+        self.consecutive_failures += 1
+        self.last_error = str(error)[:200]
+        if self.consecutive_failures >= self.failure_threshold:
+            self.open_until = time.monotonic() + self.cooldown
+            self.counts["breaker_trips"] += 1
+
+    def ttft_percentile(self, pct):
+        if not self.ttfts:
+            return None
+        ordered = sorted(self.ttfts)
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+    def error_rate(self):
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def snapshot(self):
+        return {
+            **self.counts,
+            "ttft_p50": statistics.median(self.ttfts) if self.ttfts else None,
+            "ttft_p90": self.ttft_percentile(90),
+            "error_rate": round(self.error_rate(), 3),
+            "breaker_open": not self.available(),
+            "last_error": self.last_error,
+        }
+
+
+class AllTargetsFailed(Exception):
+    pass
+
+
+def _total_tokens(chunk, default=None):
+    """total_tokens of a stream chunk's usage (the last chunk, with include_usage), else `default`."""
+    usage = usage_dict(getattr(chunk, "usage", None))
+    return usage.get("total_tokens", default) if usage else default
+
+
+class LLMRouter:
+    """
+    Picks the provider/model for each LLM request.
+
+    Tracks rolling time-to-first-token and error rate per provider:model.
+    A target that fails LLM_BREAKER_FAILURES times in a row is skipped for
+    LLM_BREAKER_COOLDOWN seconds, and requests go to its equivalents
+    (LLM_EQUIVALENTS) instead. A stream that hasn't produced its first chunk
+    after the hedge delay gets a second request raced against it (the next
+    equivalent, or the same target when there is none); the first to answer
+    wins and the other is closed.
+
+    The hedge delay is LLM_HEDGE_DELAY seconds, or, when that is None,
+    derived from the target's own p90 TTFT (never below LLM_HEDGE_MIN_DELAY);
+    without an explicit delay a target isn't hedged until it has
+    LLM_HEDGE_MIN_SAMPLES TTFT samples.
+
+    With a scheduler, every request the router sends is admitted by it under
+    the target's own provider: the first attempt and fallbacks wait for
+    their turn, a hedge is only sent if that provider has room right now.
+    The winner's permit is held until its stream ends; losers' are released.
+    """
+
+    def __init__(self, client_for, scheduler=None):
+        self.client_for = client_for  # provider -> AsyncOpenAI
+        self.scheduler = scheduler  # LLMScheduler, or None for no admission control
+        self.equivalents = getattr(config, "LLM_EQUIVALENTS", DEFAULT_EQUIVALENTS)
+        self.hedging = getattr(config, "LLM_HEDGING", True)
+        self.hedge_delay = getattr(config, "LLM_HEDGE_DELAY", None)
+        self.hedge_min_delay = getattr(config, "LLM_HEDGE_MIN_DELAY", 2.0)
+        self.hedge_min_samples = getattr(config, "LLM_HEDGE_MIN_SAMPLES", 10)
+        self.failure_threshold = getattr(config, "LLM_BREAKER_FAILURES", 3)
+        self.cooldown = getattr(config, "LLM_BREAKER_COOLDOWN", 30)
+        self.health = {}
+        self.stats = {
+            "requests": 0, "hedges": 0, "hedge_wins": 0, "hedges_throttled": 0, "fallbacks": 0, "exhausted": 0,
+        }
+
+    def _health(self, target):
+        if target not in self.health:
+            self.health[target] = TargetHealth(self.failure_threshold, self.cooldown)
+        return self.health[target]
+
+    def candidates(self, provider, model):
+        """Primary target first, then its equivalents; open breakers are skipped."""
+        primary = f"{provider}:{model}"
+        chain = [primary] + [t for t in self.equivalents.get(primary, []) if t != primary]
+        now = time.monotonic()
+        available = [t for t in chain if self._health(t).available(now)]
+        return available or chain  # Everything open: try anyway rather than fail outright
+
+    def _hedge_delay(self, target):
+        """Seconds to wait for a first chunk before hedging, or None to not hedge this target."""
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        health = self._health(target)
+        if len(health.ttfts) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, health.ttft_percentile(90) * 1.5)
+
+    async def _admit(self, target, admission):
+        """Waits for the scheduler's permit for the target's provider (None without a scheduler)."""
+        if self.scheduler is None or admission is None:
+            return None
+        return await self.scheduler.acquire(target.split(":", 1)[0], **admission)
+
+    def _try_admit(self, target, admission):
+        """A permit only if the target's provider has room now; True without a scheduler."""
+        if self.scheduler is None or admission is None:
+            return True
+        return self.scheduler.try_acquire(target.split(":", 1)[0], **admission)
+
+    def _release(self, permit, actual_tokens=None):
+        if self.scheduler is not None and permit not in (None, True):
+            self.scheduler.release(permit, actual_tokens=actual_tokens)
+
+    async def _create(self, target, stream, kwargs):
+        provider, model = target.split(":", 1)
+        return await self.client_for(provider).chat.completions.create(model=model, stream=stream, **kwargs)
+
+    async def _open_stream(self, target, kwargs):
+        """Starts a stream and waits for its first chunk. Returns (response, iterator, first_chunk, ttft)."""
+        start = time.monotonic()
+        response = await self._create(target, True, kwargs)
+        try:
+            iterator = response.__aiter__()
+            try:
+                first = await iterator.__anext__()
+            except StopAsyncIteration:
+                first = None
+            return response, iterator, first, time.monotonic() - start
+        except BaseException:
+            await response.close()
+            raise
+
+    async def complete(self, provider, model, admission=None, **kwargs):
+        """
+        Non-streaming request with failover. Returns (message, usage dict or None).
+        `admission` is {"chat_id", "priority", "tokens"} for the scheduler.
+        """
+        self.stats["requests"] += 1
+        errors = []
+        for i, target in enumerate(self.candidates(provider, model)):
+            health = self._health(target)
+            permit = await self._admit(target, admission)
+            usage = None
+            try:
+                response = await self._create(target, False, kwargs)
+                usage = usage_dict(getattr(response, "usage", None))
+            except Exception as e:
+                health.failure(e)
+                errors.append(f"{target}: {e}")
+                logging.warning(f"LLM {target} failed: {e}")
+                continue
+            finally:
+                self._release(permit, actual_tokens=(usage or {}).get("total_tokens"))
+            # Full response time isn't a TTFT: it would skew the stream hedge delay
+            health.success()
+            health.counts["wins"] += 1
+            if i:
+                self.stats["fallbacks"] += 1
+            return response.choices[0].message, usage
+        self.stats["exhausted"] += 1
+        raise AllTargetsFailed("; ".join(errors))
+
+    async def stream(self, provider, model, admission=None, **kwargs):
+        """
+        Streaming request with failover and hedging. Returns an async generator
+        of chunks once some target has produced its first chunk.
+        `admission` is {"chat_id", "priority", "tokens"} for the scheduler.
+        """
+        self.stats["requests"] += 1
+        primary = f"{provider}:{model}"
+        queue = self.candidates(provider, model)
+        pending = {}  # task -> (target, permit)
+        errors = []
+        hedge_task = None
+        hedge_blocked = False
+
+        def launch(target, permit):
+            task = asyncio.create_task(self._open_stream(target, kwargs))
+            pending[task] = (target, permit)
+            return task
+
+        target = queue.pop(0)
+        launch(target, await self._admit(target, admission))
+        try:
+            while pending:
+                timeout = None
+                if self.hedging and hedge_task is None and not hedge_blocked and len(pending) == 1:
+                    timeout = self._hedge_delay(next(iter(pending.values()))[0])
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    target = queue[0] if queue else next(iter(pending.values()))[0]
+                    permit = self._try_admit(target, admission)
+                    if permit is None:
+                        # The hedge target has no budget left: wait for the first request instead
+                        self.stats["hedges_throttled"] += 1
+                        hedge_blocked = True
+                        continue
+                    if queue:
+                        queue.pop(0)
+                    self.stats["hedges"] += 1
+                    logging.info(f"LLM hedging: no first token after {timeout:.1f}s, racing {target}")
+                    hedge_task = launch(target, permit)
+                    continue
+
+                for task in done:
+                    target, permit = pending.pop(task)
+                    try:
+                        response, iterator, first, ttft = task.result()
+                    except Exception as e:
+                        self._release(permit)
+                        self._health(target).failure(e)
+                        errors.append(f"{target}: {e}")
+                        logging.warning(f"LLM {target} failed: {e}")
+                        continue
+                    if task is hedge_task:
+                        self.stats["hedge_wins"] += 1
+                    if target != primary:
+                        self.stats["fallbacks"] += 1
+                    self._health(target).success(ttft)
+                    self._health(target).counts["wins"] += 1
+                    return self._relay(target, response, iterator, first, permit)
+
+                if not pending and queue:
+                    target = queue.pop(0)
+                    launch(target, await self._admit(target, admission))
+        finally:
+            # Losers (or everything, if we were cancelled) are cancelled and close their streams
+            for task, (target, permit) in pending.items():
+                if task.done():
+                    self._discard(task)
+                else:
+                    task.cancel()
+                self._release(permit)
+
+        self.stats["exhausted"] += 1
+        raise AllTargetsFailed("; ".join(errors))
+
+    def _discard(self, task):
+        """Closes the stream of a race loser that finished at the same time as the winner."""
+        if not task.cancelled() and task.exception() is None:
+            asyncio.ensure_future(task.result()[0].close())
+
+    async def _relay(self, target, response, iterator, first, permit=None):
+        """Yields the winner's chunks; its scheduler permit is settled with the reported usage at the end."""
+        actual_tokens = None
+        try:
+            if first is not None:
+                actual_tokens = _total_tokens(first, actual_tokens)
+                yield first
+            async for chunk in iterator:
+                actual_tokens = _total_tokens(chunk, actual_tokens)
+                yield chunk
+        except Exception as e:
+            # Chunks were already delivered, so no failover here; only count it
+            self._health(target).failure(e)
+            raise
+        finally:
+            self._release(permit, actual_tokens=actual_tokens)
+            await response.close()
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            "targets": {target: health.snapshot() for target, health in self.health.items()},
+        }
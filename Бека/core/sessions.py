@@ -0,0 +1,148 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import weakref
+
+
+class ChatLocks:
+    """
+    Registry of per-chat asyncio locks.
+
+    Each chat serializes its own history updates without blocking other chats.
+    Locks are held weakly, so idle chats do not accumulate entries.
+    """
+
+    def __init__(self):
+        self._locks = weakref.WeakValueDictionary()
+
+    def get(self, chat_id):
+        chat_id = str(chat_id)
+        lock = self._locks.get(chat_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[chat_id] = lock
+        return lock
+
+    def __len__(self):
+        return len(self._locks)
+
+
+class SessionStore:
+    """
+    Per-chat session history stored in a SQLite table (WAL mode) keyed by chat_id.
+
+    Saving a chat writes only that chat's row, off the event loop. Chats are
+    read from disk on first access and cached afterwards. SQLite's journal
+    makes every write atomic, so a crash loses at most the write in flight.
+    The WAL file is checkpointed (compacted) every `compact_every` writes.
+
+    A legacy data/sessions.json is imported once on first start.
+    """
+
+    def __init__(self, path="data/sessions.db", legacy_file="data/sessions.json", compact_every=500):
+        self.path = path
+        self.legacy_file = legacy_file
+        self.compact_every = compact_every
+        self._cache = {}  # chat_id -> history, filled lazily
+        self._seq = {}  # chat_id -> last save() issued
+        self._written = {}  # chat_id -> last save() committed
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+        self._migrate_legacy()
+
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "chat_id TEXT PRIMARY KEY, history TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        return conn
+
+    def _migrate_legacy(self):
+        if not self.legacy_file or not os.path.exists(self.legacy_file):
+            return
+
+        try:
+            with open(self.legacy_file, "r") as f:
+                legacy = json.load(f)
+        except Exception as e:
+            print(f"Skipping legacy sessions file {self.legacy_file}: {e}")
+            return
+
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO sessions (chat_id, history, updated_at) VALUES (?, ?, ?)",
+                [(str(chat_id), json.dumps(history), now) for chat_id, history in legacy.items()],
+            )
+            self._conn.execute("COMMIT")
+
+        os.replace(self.legacy_file, self.legacy_file + ".migrated")
+        print(f"Migrated {len(legacy)} sessions from {self.legacy_file} to {self.path}")
+
+    def get(self, chat_id):
+        """Returns the chat's history list, loading it from disk on first access."""
+        chat_id = str(chat_id)
+        history = self._cache.get(chat_id)
+        if history is None:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT history FROM sessions WHERE chat_id = ?", (chat_id,)
+                ).fetchone()
+            history = []
+            if row:
+                try:
+                    history = json.loads(row[0])
+                except ValueError as e:
+                    print(f"Corrupt session for chat {chat_id}, starting fresh: {e}")
+            self._cache[chat_id] = history
+        return history
+
+    def set(self, chat_id, history):
+        self._cache[str(chat_id)] = history
+
+    def append(self, chat_id, message):
+        self.get(chat_id).append(message)
+
+    async def save(self, chat_id):
+        """Persists one chat. Serialization is per chat; the write runs in a thread."""
+        chat_id = str(chat_id)
+        payload = json.dumps(self.get(chat_id))
+        seq = self._seq.get(chat_id, 0) + 1
+        self._seq[chat_id] = seq
+        await asyncio.to_thread(self._write, chat_id, payload, seq)
+
+    def _write(self, chat_id, payload, seq):
+        with self._lock:
+            # A newer snapshot of this chat already landed; don't overwrite it
+            if seq < self._written.get(chat_id, 0):
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (chat_id, history, updated_at) VALUES (?, ?, ?)",
+                (chat_id, payload, time.time()),
+            )
+            self._written[chat_id] = seq
+            self._writes += 1
+            if self.compact_every and self._writes % self.compact_every == 0:
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def compact(self):
+        """Folds the WAL back into the main database file and truncates it."""
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._conn.close()
@@ -0,0 +1,58 @@
+import time
+import config
+
+
+class DeltaBuffer:
+    """
+    Accumulates streamed text deltas in a list instead of growing a string.
+
+    append() reports when a merged update is due: once flush_interval seconds
+    have passed since the last flush, or flush_chars characters are pending.
+    take() returns the pending deltas joined into one string; text() returns
+    everything so far, joining only when something changed (the dirty flag).
+    """
+
+    def __init__(self, flush_interval=None, flush_chars=None):
+        self.flush_interval = flush_interval if flush_interval is not None else getattr(config, "STREAM_FLUSH_INTERVAL", 0.25)
+        self.flush_chars = flush_chars if flush_chars is not None else getattr(config, "STREAM_FLUSH_CHARS", 200)
+        self._parts = []
+        self._pending = 0  # Index in _parts where the unflushed deltas start
+        self._pending_chars = 0
+        self._text = ""
+        self._joined = 0  # len(_parts) when _text was last built
+        self._last_flush = time.monotonic()
+        self.dirty = False  # Changed since text() was last read
+
+    def __bool__(self):
+        return bool(self._parts)
+
+    def append(self, delta):
+        """Adds a delta. Returns True when the pending deltas should be flushed."""
+        if not delta:
+            return False
+        self._parts.append(delta)
+        self._pending_chars += len(delta)
+        self.dirty = True
+        return (
+            self._pending_chars >= self.flush_chars
+            or time.monotonic() - self._last_flush >= self.flush_interval
+        )
+
+    def has_pending(self):
+        return self._pending < len(self._parts)
+
+    def take(self):
+        """Pending deltas as one string (empty if none); resets the flush window."""
+        merged = "".join(self._parts[self._pending:])
+        self._pending = len(self._parts)
+        self._pending_chars = 0
+        self._last_flush = time.monotonic()
+        return merged
+
+    def text(self):
+        """Full text so far."""
+        if self._joined != len(self._parts):
+            self._text += "".join(self._parts[self._joined:])
+            self._joined = len(self._parts)
+        self.dirty = False
+        return self._text
@@ -0,0 +1,118 @@
+import json
+import logging
+import math
+import re
+import config
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Chat-format overhead per message (role, separators)
+MESSAGE_OVERHEAD = 4
+
+_encoding = None
+_encoding_loaded = False
+
+# Fallback: BPE tokenizers split Cyrillic into far more pieces than Latin text
+_SEGMENT = re.compile(r"[A-Za-z]+|[\u0400-\u04FF]+|\d+|\S")
+_LATIN_CHARS_PER_TOKEN = 4.0
+_CYRILLIC_CHARS_PER_TOKEN = 2.5
+
+
+def _heuristic_count(text):
+    tokens = 0
+    for segment in _SEGMENT.findall(text):
+        first = segment[0]
+        if first.isascii() and first.isalpha():
+            tokens += math.ceil(len(segment) / _LATIN_CHARS_PER_TOKEN)
+        elif "\u0400" <= first <= "\u04FF":
+            tokens += math.ceil(len(segment) / _CYRILLIC_CHARS_PER_TOKEN)
+        elif first.isdigit():
+            tokens += math.ceil(len(segment) / 3)
+        else:
+            tokens += 1  # Punctuation, emoji, CJK: roughly one token each
+    return tokens
+
+
+def _get_encoding():
+    """
+    The tiktoken encoding, loaded on first use: tiktoken downloads the BPE
+    file when it isn't in its cache (TIKTOKEN_CACHE_DIR), which must not
+    happen at import. One attempt only; afterwards the heuristic is used.
+    """
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        if tiktoken is not None:
+            try:
+                _encoding = tiktoken.get_encoding(getattr(config, "TOKENIZER_ENCODING", "o200k_base"))
+            except Exception as e:
+                logging.warning(f"Tokenizer unavailable, using the heuristic counter: {e}")
+    return _encoding
+
+
+def count_tokens(text):
+    """Token count of a string: tiktoken when installed, a script-aware estimate otherwise."""
+    if not text:
+        return 0
+    text = str(text)
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return _heuristic_count(text)
+
+
+def message_tokens(message):
+    """
+    Token count of one chat message, memoized on the message as "_tokens".
+    Keys starting with "_" are local bookkeeping and are stripped before the
+    message is sent to the LLM (see strip_private).
+    """
+    cached = message.get("_tokens")
+    if cached is not None:
+        return cached
+
+    tokens = MESSAGE_OVERHEAD + count_tokens(message.get("content"))
+    if message.get("tool_calls"):
+        tokens += count_tokens(json.dumps(message["tool_calls"], ensure_ascii=False))
+    if message.get("name"):
+        tokens += count_tokens(message["name"])
+    message["_tokens"] = tokens
+    return tokens
+
+
+def history_tokens(history):
+    return sum(message_tokens(m) for m in history)
+
+
+def strip_private(message):
+    """Copy of a message without local "_" keys, ready for the API."""
+    if not any(key.startswith("_") for key in message):
+        return message
+    return {key: value for key, value in message.items() if not key.startswith("_")}
+
+
+def usage_dict(usage):
+    """
+    Normalizes an OpenAI-style usage object (stream include_usage chunk) to a dict.
+    Context-cache counts use DeepSeek's prompt_cache_hit_tokens/prompt_cache_miss_tokens;
+    OpenAI's prompt_tokens_details.cached_tokens is mapped onto them.
+    """
+    if usage is None:
+        return None
+    if hasattr(usage, "model_dump"):
+        usage = usage.model_dump()
+    elif not isinstance(usage, dict):
+        usage = dict(vars(usage))
+    result = {key: value for key, value in usage.items() if isinstance(value, int)}
+
+    details = usage.get("prompt_tokens_details")
+    if not isinstance(details, dict) and details is not None:
+        details = getattr(details, "__dict__", {})
+    cached = (details or {}).get("cached_tokens")
+    if isinstance(cached, int) and "prompt_cache_hit_tokens" not in result:
+        result["prompt_cache_hit_tokens"] = cached
+        result["prompt_cache_miss_tokens"] = max(result.get("prompt_tokens", 0) - cached, 0)
+    return result
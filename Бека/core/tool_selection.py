@@ -0,0 +1,111 @@
+import json
+import config
+from core.retrieval import BM25Index
+from core.tokens import count_tokens
+
+# Tools that are always exposed, whatever the request is about
+DEFAULT_CORE_TOOLS = [
+    "get_current_time",
+    "read_memory",
+    "update_memory",
+    "get_full_profile",
+    "send_message",
+    "send_file",
+    "read_file",
+    "read_observation",
+]
+
+
+class ToolSelector:
+    """
+    Picks the tools worth sending to the LLM for a request.
+
+    A BM25 index over each tool's name, description and keywords ranks the
+    registry against the conversation; the top-k plus an always-on core set
+    are exposed. The index is rebuilt whenever the registry version changes.
+
+    With a chat_id the selection is sticky: tools exposed earlier in the chat
+    stay exposed (until the set would grow past TOOL_STICKY_MAX), and the list
+    is sorted by name, so the tools part of the prompt prefix stays
+    byte-identical from turn to turn and the provider's context cache keeps
+    hitting.
+    """
+
+    def __init__(self, registry, top_k=None, core_tools=None):
+        self.registry = registry
+        self.top_k = top_k or getattr(config, "TOOL_SELECTION_TOP_K", 12)
+        self.core_tools = set(core_tools or getattr(config, "TOOL_CORE_SET", DEFAULT_CORE_TOOLS))
+        self._index = None
+        self._index_version = -1
+        self._names = []
+        self._tokens_full = 0
+        self.sticky = getattr(config, "TOOL_SELECTION_STICKY", True)
+        self.sticky_max = getattr(config, "TOOL_STICKY_MAX", self.top_k * 2 + len(self.core_tools))
+        self._sticky = {}  # chat_id -> names exposed to the chat so far
+        self.stats = {"requests": 0, "tokens_full": 0, "tokens_sent": 0, "fallbacks": 0}
+
+    def _ensure_index(self):
+        if self._index_version == self.registry.version:
+            return
+        version = self.registry.version
+        definitions = self.registry.get_definitions()
+        documents = []
+        self._names = []
+        for definition in definitions:
+            name = definition["function"]["name"]
+            info = self.registry.tools.get(name, {})
+            self._names.append(name)
+            documents.append(" ".join([name, definition["function"]["description"], info.get("keywords", "")]))
+        self._index = BM25Index(documents)
+        self._tokens_full = count_tokens(self.registry.get_definitions_json())
+        self._index_version = version
+
+    def select(self, query, chat_id=None):
+        """
+        Returns (definitions, report). `definitions` is sorted by tool name so
+        the payload is stable for the same selection; `report` has the token counts.
+        """
+        self._ensure_index()
+        definitions = self.registry.get_definitions()
+
+        chosen = {self._names[i] for i in self._index.top(query, self.top_k)}
+        chosen |= self.core_tools
+        carried = 0
+        if self.sticky and chat_id is not None:
+            key = str(chat_id)
+            previous = self._sticky.get(key, set()) & set(self._names)
+            if len(previous | chosen) <= self.sticky_max:
+                carried = len(previous - chosen)
+                chosen |= previous
+            self._sticky[key] = chosen
+        selected = sorted(
+            (d for d in definitions if d["function"]["name"] in chosen),
+            key=lambda d: d["function"]["name"],
+        )
+
+        tokens_full = self._tokens_full
+        tokens_sent = count_tokens(json.dumps(selected, ensure_ascii=False, separators=(",", ":")))
+        self.stats["requests"] += 1
+        self.stats["tokens_full"] += tokens_full
+        self.stats["tokens_sent"] += tokens_sent
+
+        report = {
+            "selected": len(selected),
+            "total": len(definitions),
+            "tokens_sent": tokens_sent,
+            "tokens_saved": tokens_full - tokens_sent,
+            "sticky": carried,
+        }
+        return selected, report
+
+    def forget(self, chat_id):
+        """Drops a chat's sticky selection (e.g. on /clear)."""
+        self._sticky.pop(str(chat_id), None)
+
+    def record_fallback(self):
+        self.stats["fallbacks"] += 1
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["tokens_saved"] = stats["tokens_full"] - stats["tokens_sent"]
+        return stats
@@ -0,0 +1,89 @@
+"""
+Worker process for CPU-bound tools (see ProcessSandbox in core/executors.py).
+
+Started as `python -m core.tool_worker <memory_limit_mb>`. Requests and results
+travel over stdin/stdout as length-prefixed pickles; anything the tools print
+goes to stderr so it can't corrupt the channel.
+"""
+import importlib.util
+import os
+import pickle
+import struct
+import sys
+
+HEADER = struct.Struct("!I")
+
+
+def read_frame(stream):
+    header = stream.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    (length,) = HEADER.unpack(header)
+    payload = stream.read(length)
+    if len(payload) < length:
+        return None
+    return pickle.loads(payload)
+
+
+def write_frame(stream, obj):
+    payload = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    stream.write(HEADER.pack(len(payload)) + payload)
+    stream.flush()
+
+
+def limit_memory(memory_limit_mb):
+    if memory_limit_mb <= 0:
+        return
+    try:
+        import resource
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except Exception as e:
+        print(f"Tool worker: could not set memory limit: {e}", file=sys.stderr)
+
+
+_modules = {}  # filepath -> (mtime, module)
+
+
+def load_module(module_name, filepath):
+    mtime = os.path.getmtime(filepath)
+    cached = _modules.get(filepath)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    spec = importlib.util.spec_from_file_location(module_name, filepath)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    _modules[filepath] = (mtime, module)
+    return module
+
+
+def main():
+    memory_limit_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+    limit_memory(memory_limit_mb)
+
+    channel_in = sys.stdin.buffer
+    channel_out = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    while True:
+        request = read_frame(channel_in)
+        if request is None:
+            return
+
+        module_name, filepath, func_name, kwargs = request
+        try:
+            func = getattr(load_module(module_name, filepath), func_name)
+            result = func(**kwargs)
+            try:
+                write_frame(channel_out, ("ok", result))
+            except (pickle.PicklingError, TypeError, AttributeError):
+                write_frame(channel_out, ("ok", str(result)))
+        except MemoryError:
+            write_frame(channel_out, ("error", f"Error: Tool '{func_name}' exceeded the worker memory limit ({memory_limit_mb} MB)."))
+        except Exception as e:
+            write_frame(channel_out, ("error", f"Error executing tool '{func_name}': {str(e)}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,48 +6,361 @@ import asyncio
 import config
 import sys
 import traceback
+import json
+import time
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from core.manifest import load_manifest, build_signature, scan_module
+from core.executors import ToolExecutors, ProcessSandbox
+
+# Results that look like failures are never cached
+ERROR_PREFIXES = ("Error", "❌", "Ошибка")
+
+
+def is_error_result(value):
+    if isinstance(value, str):
+        return value.startswith(ERROR_PREFIXES)
+    if isinstance(value, dict):
+        return bool(value.get("error")) or value.get("success") is False
+    return False
+
+
+class ToolCache:
+    """
+    TTL result cache for idempotent tools.
+
+    In-memory LRU with an optional on-disk tier (one JSON file per entry) for
+    tools registered with cache_persist=True. Concurrent identical calls share
+    one execution instead of each hitting the network.
+    """
+
+    def __init__(self, max_entries=512, cache_dir=None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._inflight = {}  # key -> asyncio.Future of the running call
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0, "evictions": 0}
+
+    @staticmethod
+    def make_key(tool_name, policy, kwargs, tool_context=None):
+        """
+        Cache-key policies:
+        - "args": tool name + arguments (shared across chats)
+        - "chat": same, but scoped to the calling chat
+        - callable(kwargs, tool_context) -> str: custom key
+        """
+        if callable(policy):
+            raw = str(policy(kwargs, tool_context or {}))
+        else:
+            raw = json.dumps(kwargs, sort_keys=True, ensure_ascii=False, default=str)
+            if policy == "chat":
+                raw = f"{(tool_context or {}).get('chat_id')}:{raw}"
+        return f"{tool_name}:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
+
+    def get(self, key):
+        """Memory tier only: returns (found, value) and counts a hit. Never blocks on disk."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return True, entry[1]
+                del self._entries[key]
+        return False, None
+
+    async def get_async(self, key, persist=False):
+        """
+        Returns (found, value): memory tier, then (for persisted tools) the disk
+        tier, read off the event loop. Only hits are counted here; the caller
+        counts the lookup as a miss or as coalesced, so each lookup counts once.
+        """
+        found, value = self.get(key)
+        if found or not (persist and self.cache_dir):
+            return found, value
+
+        entry = await asyncio.to_thread(self._read_disk, key)
+        if entry and entry[0] > time.time():
+            with self._lock:
+                self._store(key, entry)
+                self.stats["disk_hits"] += 1
+            return True, entry[1]
+        return False, None
+
+    def record_miss(self, coalesced=False):
+        with self._lock:
+            self.stats["coalesced" if coalesced else "misses"] += 1
+
+    def put(self, key, value, ttl, persist=False):
+        """Stores a result in memory; returns the entry to persist, or None if it isn't cacheable."""
+        if is_error_result(value):
+            return None
+
+        entry = (time.time() + ttl, value)
+        with self._lock:
+            self._store(key, entry)
+        if persist and self.cache_dir:
+            return entry
+        return None
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key.replace(":", "_") + ".json")
+
+    def _read_disk(self, key):
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data["expires_at"], data["value"]
+        except Exception:
+            return None
+
+    def _write_disk(self, key, entry):
+        try:
+            if not os.path.exists(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            path = self._disk_path(key)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"expires_at": entry[0], "value": entry[1]}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except (TypeError, ValueError):
+            pass  # Not JSON-serializable: memory tier only
+        except Exception as e:
+            print(f"Tool cache disk write failed: {e}")
+
+    def _disk_files(self, tool_names=None):
+        if not self.cache_dir or not os.path.isdir(self.cache_dir):
+            return []
+        files = glob.glob(os.path.join(self.cache_dir, "*.json"))
+        if tool_names is None:
+            return files
+        # File names are "<tool>_<sha256>.json"; match the whole tool name, not a prefix of another
+        pattern = re.compile(r"^(%s)_[0-9a-f]{64}\.json$" % "|".join(re.escape(name) for name in tool_names))
+        return [path for path in files if pattern.match(os.path.basename(path))]
+
+    def _remove_disk(self, tool_names=None):
+        for path in self._disk_files(tool_names):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def clear(self):
+        """Drops every entry, in memory and on disk."""
+        with self._lock:
+            self._entries.clear()
+        self._remove_disk()
+
+    def invalidate(self, tool_names):
+        """Drops the entries of the given tools, in memory and on disk."""
+        tool_names = list(tool_names)
+        prefixes = tuple(f"{name}:" for name in tool_names)
+        if not prefixes:
+            return
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefixes)]:
+                del self._entries[key]
+        self._remove_disk(tool_names)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+            stats["inflight"] = len(self._inflight)
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_ratio"] = (stats["hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except Exception:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
 
 class ToolRegistry:
     def __init__(self):
+        # Never mutated in place: writers build a new dict and swap it in, so
+        # readers (and in-flight calls) always see one consistent version.
         self.tools = {}
-        self.descriptions = []
         self.context = {}
         self.allowed_users = getattr(config, "ALLOWED_USERS", [])
+        # Bumped by register()/reload_modules(); cached definitions are tied to it
+        self.version = 0
+        self._definitions = None
+        self._definitions_json = None
+        self._definitions_version = -1
+        self.cache = ToolCache(
+            max_entries=getattr(config, "TOOL_CACHE_SIZE", 512),
+            cache_dir=getattr(config, "TOOL_CACHE_DIR", "data/tool_cache"),
+        )
+        self.executors = ToolExecutors()
+        self.sandbox = ProcessSandbox()
+        # Lazy loading: module_name -> filepath of modules whose code isn't imported yet
+        self.lazy_modules = {}
+        self.load_errors = {}  # module_name -> last import error
+        self.loaded_modules = {}  # module_name -> module object of its last successful import
+        self.lazy = False
+        self.modules_dir = "modules"
+        self._loading_module = None
+        self._loading_path = None
+        self._staging = None  # Tools collected by the module load in progress
+        self._module_lock = threading.RLock()  # Serializes registry writers
+        self.manifest_path = getattr(config, "TOOL_MANIFEST_FILE", "data/tool_manifest.json")
+        self.load_report = {}
 
     def set_global_context(self, **kwargs):
         """Set global context variables available to tools."""
         self.context.update(kwargs)
 
-    def register(self, name, func, description, requires_context=False):
-        """Register a new tool."""
+    def register(self, name, func, description, requires_context=False, cache_ttl=None, cache_key="args", cache_persist=False, keywords="", exec_class=None, timeout=None, memory_limit_mb=None):
+        """
+        Register a new tool.
+        Idempotent tools can opt into result caching with cache_ttl (seconds),
+        a cache_key policy (see ToolCache.make_key) and cache_persist for the disk tier.
+        keywords are extra search terms for tool selection (e.g. Russian synonyms).
+        exec_class picks the pool a sync tool runs in ("fast", "io", "cpu",
+        "subprocess"; default "io"); timeout overrides that pool's per-call timeout.
+        "cpu" tools without requires_context run in the process sandbox, under
+        memory_limit_mb if given (default SANDBOX_MEMORY_MB).
+        """
         is_async = inspect.iscoroutinefunction(func)
-        self.tools[name] = {
+        try:
+            sig = inspect.signature(func)
+        except (TypeError, ValueError):
+            sig = None
+        self._add_tool(name, {
             "func": func,
             "description": description,
             "requires_context": requires_context,
-            "is_async": is_async
-        }
+            "is_async": is_async,
+            "signature": sig,
+            "cache_ttl": cache_ttl,
+            "cache_key": cache_key,
+            "cache_persist": cache_persist,
+            "keywords": keywords,
+            "exec_class": self.executors.resolve(exec_class),
+            "timeout": timeout,
+            "memory_limit_mb": memory_limit_mb,
+            "module": self._loading_module,
+            "path": self._loading_path,
+            # Only module-level functions can be looked up by name in a sandbox worker
+            "func_name": func.__name__ if (
+                getattr(func, "__module__", None) == self._loading_module
+                and getattr(func, "__qualname__", None) == getattr(func, "__name__", None)
+            ) else None,
+            "lazy": False,
+        })
 
-        try:
-            sig = inspect.signature(func)
+    def _add_tool(self, name, info):
+        sig = info["signature"]
+        if sig is not None:
             internal_args = ["bot", "chat_id", "context", "job_queue", "registry"]
             params = [p.name for p in sig.parameters.values() if p.name not in internal_args]
             args_desc = ", ".join(params)
-        except:
+        else:
             args_desc = "..."
+        info["summary"] = f"- {name}({args_desc}): {info['description']}"
 
-        self.descriptions.append(f"- {name}({args_desc}): {description}")
+        with self._module_lock:
+            if self._staging is not None:
+                self._staging[name] = info
+            else:
+                tools = dict(self.tools)
+                tools[name] = info
+                self._publish(tools)
 
-    def load_modules(self, modules_dir="modules"):
-        """Load python files from modules directory."""
-        if not os.path.exists(modules_dir):
-            os.makedirs(modules_dir)
+    def _publish(self, tools):
+        """Swaps in a new tool map. A single reference assignment, so readers never see a partial update."""
+        self.tools = tools
+        self.version += 1
+
+    def _register_lazy(self, module_name, spec, filepath=None):
+        """Registers a tool from its manifest entry; the module is imported on first call."""
+        options = spec["options"]
+        self._add_tool(spec["name"], {
+            "func": self._make_lazy_stub(module_name, spec["name"], spec["is_async"]),
+            "description": spec["description"],
+            "requires_context": options.get("requires_context", False),
+            "is_async": spec["is_async"],
+            "signature": build_signature(spec["params"]),
+            "cache_ttl": options.get("cache_ttl"),
+            "cache_key": options.get("cache_key", "args"),
+            "cache_persist": options.get("cache_persist", False),
+            "keywords": options.get("keywords", ""),
+            "exec_class": self.executors.resolve(options.get("exec_class")),
+            "timeout": options.get("timeout"),
+            "memory_limit_mb": options.get("memory_limit_mb"),
+            "module": module_name,
+            "path": filepath,
+            "func_name": spec["func_name"],
+            "lazy": True,
+        })
 
-        for filepath in glob.glob(os.path.join(modules_dir, "*.py")):
-            module_name = os.path.basename(filepath)[:-3]
-            if module_name == "__init__":
-                continue
+    def _make_lazy_stub(self, module_name, tool_name, is_async):
+        if is_async:
+            async def stub(**kwargs):
+                await asyncio.to_thread(self._ensure_loaded, module_name)
+                res = self._call_loaded(tool_name, kwargs)
+                if asyncio.iscoroutine(res):
+                    return await res
+                return res
+        else:
+            def stub(**kwargs):
+                self._ensure_loaded(module_name)
+                return self._call_loaded(tool_name, kwargs)
+        return stub
 
+    def _call_loaded(self, tool_name, kwargs):
+        info = self.tools.get(tool_name)
+        if not info or info["lazy"]:
+            return f"Error: Tool '{tool_name}' is no longer registered by its module."
+        return info["func"](**kwargs)
+
+    def _ensure_loaded(self, module_name):
+        """
+        Imports a deferred module on the first call of one of its tools. If the
+        import fails the module stays deferred (the next call retries) and the
+        import error is raised to the caller.
+        """
+        with self._module_lock:
+            filepath = self.lazy_modules.get(module_name)
+            if filepath:
+                staged = self._import_module(module_name, filepath)
+                if staged is None:
+                    raise ImportError(f"Module '{module_name}' failed to load: {self.load_errors.get(module_name)}")
+                self.lazy_modules.pop(module_name, None)
+                self._replace_module_tools(module_name, staged)
+
+    def _import_module(self, module_name, filepath):
+        """
+        Executes a module file and collects the tools it registers.
+        Returns {name: info}, or None if the module failed to load.
+        """
+        with self._module_lock:
+            previous = (self._loading_module, self._loading_path, self._staging)
+            self._loading_module = module_name
+            self._loading_path = filepath
+            self._staging = {}
             try:
                 spec = importlib.util.spec_from_file_location(module_name, filepath)
                 if spec and spec.loader:
@@ -57,14 +370,118 @@ class ToolRegistry:
                     if hasattr(module, "register_tools"):
                         module.register_tools(self)
                         print(f"Loaded module: {module_name}")
+                    self.loaded_modules[module_name] = module
+                self.load_errors.pop(module_name, None)
+                return self._staging
             except Exception as e:
+                self.load_errors[module_name] = f"{type(e).__name__}: {e}"
                 print(f"Error loading module {module_name} from {filepath}: {e}")
                 traceback.print_exc()
+                return None
+            finally:
+                self._loading_module, self._loading_path, self._staging = previous
+
+    def get_module(self, module_name):
+        """
+        The loaded module object of modules/<module_name>.py, importing it now
+        if it hasn't been yet (deferred, or without tools). Core code calls
+        module helpers through this rather than loading the file itself, so it
+        runs the same code as the tools, including after a reload.
+        """
+        with self._module_lock:
+            if module_name in self.lazy_modules:
+                self._ensure_loaded(module_name)
+            elif module_name not in self.loaded_modules:
+                filepath = os.path.join(self.modules_dir, f"{module_name}.py")
+                staged = self._import_module(module_name, filepath)
+                if staged is None:
+                    raise ImportError(f"Module '{module_name}' failed to load: {self.load_errors.get(module_name)}")
+                if staged:
+                    self._replace_module_tools(module_name, staged)
+            return self.loaded_modules[module_name]
+
+    def _scan_or_import(self, module_name, filepath, tools_spec):
+        """Collects a module's tools: lazily from its manifest entry when possible."""
+        if tools_spec is None:
+            return self._import_module(module_name, filepath)
+
+        with self._module_lock:
+            previous = self._staging
+            self._staging = {}
+            try:
+                if tools_spec:
+                    self.lazy_modules[module_name] = filepath
+                    for spec in tools_spec:
+                        self._register_lazy(module_name, spec, filepath)
+                return self._staging
+            finally:
+                self._staging = previous
+
+    def _replace_module_tools(self, module_name, staged):
+        tools = {name: info for name, info in self.tools.items() if info.get("module") != module_name}
+        tools.update(staged)
+        self._publish(tools)
+
+    def load_modules(self, modules_dir="modules", lazy=None):
+        """
+        Load python files from modules directory.
+
+        In lazy mode (config.LAZY_MODULES) tool metadata comes from a cached
+        static manifest and each module is imported on the first call of one
+        of its tools. Modules whose registrations can't be read statically are
+        imported right away; modules without register_tools() are skipped.
+        """
+        if lazy is None:
+            lazy = getattr(config, "LAZY_MODULES", False)
+        if not os.path.exists(modules_dir):
+            os.makedirs(modules_dir)
+
+        started = time.perf_counter()
+        rss_before = current_rss_mb()
+
+        # Build the complete map off to the side, then publish it in one swap
+        with self._module_lock:
+            tools = self._load_all(modules_dir, lazy)
+            merged = dict(self.tools)
+            merged.update(tools)
+            self._publish(merged)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        rss_after = current_rss_mb()
+        self.load_report = {
+            "mode": "lazy" if lazy else "eager",
+            "tools": len(self.tools),
+            "deferred_modules": len(self.lazy_modules),
+            "elapsed_ms": elapsed_ms,
+            "rss_mb": rss_after,
+            "rss_delta_mb": rss_after - rss_before,
+        }
+        print(
+            f"Loaded {len(self.tools)} tools ({self.load_report['mode']}, "
+            f"{len(self.lazy_modules)} modules deferred) in {elapsed_ms:.0f} ms, "
+            f"RSS {rss_after:.1f} MB (+{rss_after - rss_before:.1f} MB)"
+        )
+
+    def _load_all(self, modules_dir, lazy):
+        """Collects the tools of every module without publishing them."""
+        self.lazy = lazy
+        self.modules_dir = modules_dir
+        tools = {}
+        if lazy:
+            manifest = load_manifest(modules_dir, self.manifest_path)
+            for module_name, entry in manifest.items():
+                staged = self._scan_or_import(module_name, entry["path"], entry["tools"])
+                tools.update(staged or {})
+        else:
+            for filepath in glob.glob(os.path.join(modules_dir, "*.py")):
+                module_name = os.path.basename(filepath)[:-3]
+                if module_name == "__init__":
+                    continue
+                tools.update(self._import_module(module_name, filepath) or {})
+        return tools
 
     def reload_modules(self):
         """Reloads all modules dynamically."""
-        self.tools = {}
-        self.descriptions = []
         # We need to invalidate cache to force re-read from disk
         to_remove = []
         for name, module in sys.modules.items():
@@ -80,27 +497,86 @@ class ToolRegistry:
                 del sys.modules[name]
 
         print("Reloading modules...")
-        self.load_modules()
+        with self._module_lock:
+            # The old map stays live (and lazy stubs wait on the lock) until the new one is complete
+            self.lazy_modules = {}
+            self.loaded_modules = {}
+            self._publish(self._load_all(self.modules_dir, self.lazy))
+            self.cache.clear()
         return "Modules reloaded."
 
+    def reload_module(self, filepath):
+        """
+        Re-imports a single changed (or deleted) module file and swaps the
+        resulting tool map in atomically. Tools of other modules are untouched;
+        calls already running keep the function they started with. If the file
+        fails to load, its previous tools stay registered.
+        """
+        module_name = os.path.basename(filepath)[:-3]
+        if module_name == "__init__":
+            return f"Skipped {filepath}."
+
+        # Modules importing this one (from modules.x import ...) should get the new code next time
+        sys.modules.pop(module_name, None)
+        sys.modules.pop(f"modules.{module_name}", None)
+
+        with self._module_lock:
+            old_names = [name for name, info in self.tools.items() if info.get("module") == module_name]
+            old_module = self.loaded_modules.get(module_name)
+            self.lazy_modules.pop(module_name, None)
+
+            if not os.path.exists(filepath):
+                staged = {}
+            elif self.lazy:
+                try:
+                    tools_spec = scan_module(filepath)
+                except SyntaxError as e:
+                    print(f"Error loading module {module_name} from {filepath}: {e}")
+                    return f"Error reloading {module_name}: {e}"
+                staged = self._scan_or_import(module_name, filepath, tools_spec)
+            else:
+                staged = self._import_module(module_name, filepath)
+
+            if staged is None:
+                return f"Error reloading {module_name}; keeping the previous version."
+
+            self._replace_module_tools(module_name, staged)
+            self.cache.invalidate(set(old_names) | set(staged))
+            if self.loaded_modules.get(module_name) is old_module:
+                # Deferred again or deleted: get_module() must not hand out the old code
+                self.loaded_modules.pop(module_name, None)
+
+        print(f"Reloaded module: {module_name} ({len(staged)} tools)")
+        return f"Module {module_name} reloaded."
+
     def is_async(self, tool_name):
-        if tool_name in self.tools:
-            return self.tools[tool_name]["is_async"]
+        tool_info = self.tools.get(tool_name)
+        if tool_info:
+            return tool_info["is_async"]
         return False
 
     def execute(self, tool_name, tool_context=None, **kwargs):
         """Execute a tool by name. If async, returns coroutine."""
-        if tool_name not in self.tools:
+        # One lookup: the call keeps this version even if a reload swaps the map meanwhile
+        tool_info = self.tools.get(tool_name)
+        if tool_info is None:
             return f"Error: Tool '{tool_name}' not found."
+        return self._invoke(tool_name, tool_info, tool_context, kwargs)
 
+    def _authorization_error(self, tool_context):
         # Check authorization if context provided
         if tool_context and "chat_id" in tool_context:
             chat_id = str(tool_context["chat_id"])
             if self.allowed_users:
                  if chat_id not in self.allowed_users:
                      return f"Error: User {chat_id} is not authorized to use tools."
+        return None
+
+    def _invoke(self, tool_name, tool_info, tool_context, kwargs):
+        error = self._authorization_error(tool_context)
+        if error:
+            return error
 
-        tool_info = self.tools[tool_name]
         func = tool_info["func"]
 
         # Merge contexts
@@ -119,17 +595,115 @@ class ToolRegistry:
         except Exception as e:
             return f"Error executing tool '{tool_name}': {str(e)}"
 
+    async def execute_async(self, tool_name, tool_context=None, **kwargs):
+        """
+        Awaitable execute(): sync tools run in their execution-class pool. Results of tools
+        registered with cache_ttl are served from the cache, and identical
+        calls already in flight are joined instead of repeated.
+        """
+        tool_info = self.tools.get(tool_name)
+        if tool_info is None:
+            return f"Error: Tool '{tool_name}' not found."
+        # Before the cache: a hit or a joined call must not bypass authorization
+        error = self._authorization_error(tool_context)
+        if error:
+            return error
+        if not tool_info.get("cache_ttl"):
+            return await self._execute_uncached(tool_name, tool_info, tool_context, kwargs)
+
+        persist = tool_info["cache_persist"]
+        key = self.cache.make_key(tool_name, tool_info["cache_key"], kwargs, tool_context)
+        found, value = await self.cache.get_async(key, persist=persist)
+        if found:
+            return value
+
+        task = self.cache._inflight.get(key)
+        self.cache.record_miss(coalesced=task is not None)
+        if task is None:
+            # Run as its own task so a cancelled caller doesn't abort the call for the others
+            task = asyncio.ensure_future(self._execute_uncached(tool_name, tool_info, tool_context, kwargs))
+            self.cache._inflight[key] = task
+
+            def _done(t):
+                self.cache._inflight.pop(key, None)
+                if not t.cancelled() and t.exception() is None:
+                    entry = self.cache.put(key, t.result(), tool_info["cache_ttl"], persist=persist)
+                    if entry is not None:
+                        # The disk write stays off the event loop too
+                        asyncio.get_running_loop().run_in_executor(None, self.cache._write_disk, key, entry)
+
+            task.add_done_callback(_done)
+
+        return await asyncio.shield(task)
+
+    async def _execute_uncached(self, tool_name, tool_info, tool_context, kwargs):
+        if tool_info["is_async"]:
+            res = self._invoke(tool_name, tool_info, tool_context, kwargs)
+            if asyncio.iscoroutine(res):
+                timeout = tool_info["timeout"]
+                if timeout:
+                    try:
+                        return await asyncio.wait_for(res, timeout)
+                    except asyncio.TimeoutError:
+                        return f"Error: Tool '{tool_name}' timed out after {timeout}s."
+                return await res
+            return res
+        if self._use_sandbox(tool_info):
+            return await self.sandbox.run(
+                tool_info["module"], tool_info["path"], tool_info["func_name"], kwargs,
+                timeout=tool_info["timeout"], memory_limit_mb=tool_info.get("memory_limit_mb"),
+            )
+        return await self.executors.run(
+            tool_info["exec_class"], self._invoke, tool_name, tool_info, tool_context, kwargs,
+            timeout=tool_info["timeout"],
+        )
+
+    def _use_sandbox(self, tool_info):
+        return (
+            self.sandbox.enabled
+            and tool_info["exec_class"] == "cpu"
+            and not tool_info["requires_context"]
+            and tool_info.get("path")
+            and tool_info.get("func_name")
+        )
+
+    def cache_stats(self):
+        """Hit/miss counters of the tool result cache."""
+        return self.cache.get_stats()
+
+    def executor_stats(self):
+        """Queue depth, wait times and timeouts per execution class (plus the process sandbox)."""
+        stats = self.executors.get_stats()
+        stats["sandbox"] = self.sandbox.get_stats()
+        return stats
+
     def get_descriptions(self):
         """Get formatted descriptions of all tools."""
-        return "\n".join(self.descriptions)
+        return "\n".join(info["summary"] for info in self.tools.values())
 
     def get_definitions(self):
-        """Generate OpenAI-compatible tool definitions."""
+        """
+        OpenAI-compatible tool definitions, rebuilt only when the registry changes.
+        The returned list is shared between callers and must not be modified.
+        """
+        if self._definitions_version != self.version:
+            version = self.version
+            definitions = self._build_definitions()
+            self._definitions = definitions
+            self._definitions_json = json.dumps(definitions, ensure_ascii=False, separators=(",", ":"))
+            self._definitions_version = version
+        return self._definitions
+
+    def get_definitions_json(self):
+        """The same definitions, serialized once per registry version."""
+        self.get_definitions()
+        return self._definitions_json
+
+    def _build_definitions(self):
         definitions = []
         internal_args = ["bot", "chat_id", "context", "job_queue", "registry"]
 
-        for name, info in self.tools.items():
-            func = info["func"]
+        for name, info in self.tools.items():  # self.tools is replaced, never mutated: safe to iterate
             desc = info["description"]
 
             # Build parameters schema
@@ -137,7 +711,7 @@ class ToolRegistry:
             required = []
 
             try:
-                sig = inspect.signature(func)
+                sig = info["signature"]
                 for param_name, param in sig.parameters.items():
                     if param_name in internal_args or param_name in ["kwargs", "args"]:
                         continue
@@ -0,0 +1,40 @@
+import asyncio
+from telegram.ext import BaseUpdateProcessor
+from core.sessions import ChatLocks
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Processes updates from different chats concurrently while keeping each
+    chat's updates strictly in arrival order.
+
+    Installed with ApplicationBuilder().concurrent_updates(). At most
+    max_concurrent_updates handlers run at once; up to max_pending updates
+    may be admitted in total (running or waiting for their chat's turn).
+    An update waits for its chat before taking a worker slot, so a busy chat
+    never ties up workers that other chats could use. Updates without a chat
+    (e.g. inline queries) only need a worker slot.
+    """
+
+    def __init__(self, max_concurrent_updates, max_pending=None):
+        super().__init__(max_pending or max_concurrent_updates * 8)
+        self.max_workers = max_concurrent_updates
+        self._workers = asyncio.Semaphore(max_concurrent_updates)
+        self._chat_locks = ChatLocks()
+
+    async def do_process_update(self, update, coroutine):
+        chat = getattr(update, "effective_chat", None)
+        if chat is None:
+            async with self._workers:
+                await coroutine
+            return
+
+        async with self._chat_locks.get(chat.id):
+            async with self._workers:
+                await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
@@ -6,32 +6,47 @@ from watchdog.events import FileSystemEventHandler
 class ModuleHandler(FileSystemEventHandler):
     def __init__(self, registry):
         self.registry = registry
-        self.last_reload = 0
+        self.last_reload = {}  # path -> time of last reload
 
     def on_created(self, event):
         if event.is_directory:
             return
         if event.src_path.endswith(".py"):
-            self._trigger_reload()
+            self._trigger_reload(event.src_path)
 
     def on_modified(self, event):
         if event.is_directory:
             return
         if event.src_path.endswith(".py"):
-            self._trigger_reload()
+            self._trigger_reload(event.src_path)
 
-    def _trigger_reload(self):
-        # Debounce reload (1 second)
+    def on_deleted(self, event):
+        if event.is_directory:
+            return
+        if event.src_path.endswith(".py"):
+            self._trigger_reload(event.src_path, debounce=False)
+
+    def on_moved(self, event):
+        if event.is_directory:
+            return
+        if event.src_path.endswith(".py"):
+            self._trigger_reload(event.src_path, debounce=False)
+        if event.dest_path.endswith(".py"):
+            self._trigger_reload(event.dest_path, debounce=False)
+
+    def _trigger_reload(self, path, debounce=True):
+        # Debounce reload per file (1 second): editors emit several events per save
         now = time.time()
-        if now - self.last_reload < 1:
+        if debounce and now - self.last_reload.get(path, 0) < 1:
             return
-        self.last_reload = now
+        self.last_reload[path] = now
 
         try:
-            print(f"File change detected. Reloading modules...")
-            self.registry.reload_modules()
+            print(f"File change detected: {path}")
+            # Only this file is re-imported; the registry swaps in the new tool map atomically
+            self.registry.reload_module(path)
         except Exception as e:
-            print(f"Error reloading modules: {e}")
+            print(f"Error reloading module {path}: {e}")
 
 class ModuleWatcher:
     def __init__(self, registry, modules_dir="modules"):
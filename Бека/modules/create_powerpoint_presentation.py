@@ -5,6 +5,9 @@ from pptx.enum.text import PP_ALIGN
 from pptx.enum.shapes import MSO_SHAPE
 import os
 
+def register_tools(registry):
+    registry.register("create_figure_skating_presentation", create_figure_skating_presentation, "Creates a PowerPoint presentation about the top-10 figure skaters. Arguments: output_path (str, optional).", keywords="презентация фигурное катание pptx", exec_class="cpu")
+
 def create_figure_skating_presentation(output_path='figure_skating_presentation.pptx'):
     """Создает презентацию PowerPoint о топ-10 фигуристках"""
 
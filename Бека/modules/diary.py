@@ -2,9 +2,9 @@ import os
 import datetime
 
 def register_tools(registry):
-    registry.register("add_diary_entry", add_entry, "Adds a new entry to the user diary. Arguments: text (str).")
-    registry.register("read_diary", read_entries, "Reads diary entries. Arguments: date (str, optional, YYYY-MM-DD).")
-    registry.register("setup_diary_reminder", setup_reminder, "Sets up a daily diary reminder. Arguments: time (str, e.g., '20:00').", requires_context=True)
+    registry.register("add_diary_entry", add_entry, "Adds a new entry to the user diary. Arguments: text (str).", keywords="дневник запиши запись", exec_class="fast")
+    registry.register("read_diary", read_entries, "Reads diary entries. Arguments: date (str, optional, YYYY-MM-DD).", keywords="дневник записи прочитай", exec_class="fast")
+    registry.register("setup_diary_reminder", setup_reminder, "Sets up a daily diary reminder. Arguments: time (str, e.g., '20:00').", requires_context=True, keywords="дневник напоминание")
 
 def add_entry(text):
     """Adds a diary entry."""
@@ -2,6 +2,9 @@ import cv2
 import sys
 import os
 
+def register_tools(registry):
+    registry.register("extract_frame", extract_frame, "Extracts a frame from a video at the given second. Arguments: video_path (str), output_path (str, optional), frame_time (float, optional).", keywords="кадр видео скриншот", exec_class="cpu", memory_limit_mb=2048)
+
 def extract_frame(video_path, output_path='frame.jpg', frame_time=2):
     """
     Извлекает кадр из видео в указанное время (в секундах)
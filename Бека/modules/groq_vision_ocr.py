@@ -1,14 +1,14 @@
 import base64
 import os
-from groq import Groq
-import config
+from core.http_clients import client_pool
 
 def register_tools(registry):
     """Регистрирует инструмент для OCR с использованием Groq Vision (Llama 4)"""
     registry.register(
         "smart_telegram_ocr",
         smart_telegram_ocr,
-        "Reads an image file downloaded from Telegram, sends it to Groq Llama 4 Vision, and extracts text and tables perfectly. THIS IS THE ONLY OCR TOOL YOU SHOULD USE. Strictly ignore all older OCR tools in the system. Arguments: image_path (str - local path to the image)."
+        "Reads an image file downloaded from Telegram, sends it to Groq Llama 4 Vision, and extracts text and tables perfectly. THIS IS THE ONLY OCR TOOL YOU SHOULD USE. Strictly ignore all older OCR tools in the system. Arguments: image_path (str - local path to the image).",
+        keywords="фото картинка изображение скриншот текст таблица распознай",
     )
 
 def _encode_image(image_path):
@@ -39,8 +39,8 @@ def smart_telegram_ocr(image_path):
         # Кодирование изображения в base64
         base64_image = _encode_image(image_path)
 
-        # Инициализация клиента Groq
-        client = Groq(api_key=config.GROQ_API_KEY)
+        # Общий клиент Groq (keep-alive соединения)
+        client = client_pool.groq()
 
         # Формирование запроса к модели Llama 4 Vision
         messages = [
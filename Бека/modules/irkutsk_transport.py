@@ -234,11 +234,15 @@ def register_tools(registry):
         "irkutsk_bus_schedule",
         get_bus_schedule,
         "Получить расписание автобуса в Иркутске. Аргументы: bus_number (номер автобуса, например 55), direction (A или B).",
+        cache_ttl=3600,
+        cache_persist=True,
     )
     registry.register(
         "irkutsk_stop_schedule",
         get_stop_schedule,
         "Получить расписание для остановки в Иркутске. Аргумент: stop_name (название остановки, например '6-й микрорайон').",
+        cache_ttl=3600,
+        cache_persist=True,
     )
     registry.register(
         "irkutsk_6_microdistrict",
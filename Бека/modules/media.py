@@ -1,15 +1,15 @@
 import os
 import requests
 import yt_dlp
-from openai import OpenAI
 import config
+from core.http_clients import client_pool
 import base64
 
 def register_tools(registry):
-    registry.register("download_video", download_video, "Downloads a video. Arguments: url (str). Returns filepath.")
-    registry.register("transcribe_audio", transcribe_audio, "Transcribes audio file. Arguments: filepath (str).")
-    registry.register("recognize_image", recognize_image, "Recognizes text in an image using OCR.Space. Arguments: filepath (str).")
-    registry.register("recognize_image_groq", recognize_image_groq, "Recognizes text/content in an image using Groq Vision. Arguments: filepath (str).")
+    registry.register("download_video", download_video, "Downloads a video. Arguments: url (str). Returns filepath.", keywords="видео скачай youtube ютуб", exec_class="subprocess", timeout=1800)
+    registry.register("transcribe_audio", transcribe_audio, "Transcribes audio file. Arguments: filepath (str).", keywords="голосовое аудио расшифруй речь")
+    registry.register("recognize_image", recognize_image, "Recognizes text in an image using OCR.Space. Arguments: filepath (str).", keywords="фото картинка изображение текст")
+    registry.register("recognize_image_groq", recognize_image_groq, "Recognizes text/content in an image using Groq Vision. Arguments: filepath (str).", keywords="фото картинка изображение опиши")
 
 def download_video(url):
     """Downloads a video using yt-dlp."""
@@ -35,10 +35,7 @@ def download_video(url):
 def transcribe_audio(filepath):
     """Transcribes audio using Groq Whisper."""
     try:
-        client = OpenAI(
-            api_key=config.GROQ_API_KEY,
-            base_url="https://api.groq.com/openai/v1"
-        )
+        client = client_pool.openai("groq")
 
         if not os.path.exists(filepath):
             return "Error: File not found."
@@ -92,10 +89,7 @@ def recognize_image_groq(filepath):
         if not os.path.exists(filepath):
             return "Error: File not found."
 
-        client = OpenAI(
-            api_key=config.GROQ_API_KEY,
-            base_url="https://api.groq.com/openai/v1"
-        )
+        client = client_pool.openai("groq")
 
         def encode_image(image_path):
             with open(image_path, "rb") as image_file:
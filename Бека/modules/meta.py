@@ -3,8 +3,8 @@ import os
 import subprocess
 
 def register_tools(registry):
-    registry.register("install_package", install_package, "Installs a pip package. Arguments: package_name (str).")
-    registry.register("restart_bot", restart_bot, "Restarts the bot application.")
+    registry.register("install_package", install_package, "Installs a pip package. Arguments: package_name (str).", keywords="установи пакет библиотека pip", exec_class="subprocess", timeout=600)
+    registry.register("restart_bot", restart_bot, "Restarts the bot application.", keywords="перезапусти перезагрузи бота")
 
 def install_package(package_name):
     """Installs a python package via pip."""
@@ -0,0 +1,9 @@
+def register_tools(registry):
+    registry.register("read_observation", read_observation, "Reads part of a large tool output that was shortened in the conversation. Arguments: handle (str, e.g. 'obs-1', given with the shortened output), offset (int, character to start at, default 0), length (int, characters, default 2000).", requires_context=True, keywords="вывод результат страница дальше полностью output page", exec_class="fast")
+
+def read_observation(handle, offset: int = 0, length: int = 2000, **kwargs):
+    """Pages through a tool result kept in this run's observation store (passed in the tool context)."""
+    store = kwargs.get("observation_store")
+    if store is None:
+        return "Error: No stored observations in this conversation turn."
+    return store.read(handle, offset, length)
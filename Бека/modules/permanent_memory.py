@@ -5,8 +5,8 @@ from core.memory_rag import memory_instance
 MEMORY_FILE = os.path.join("Permanent memory", "Permanent-memory")
 
 def register_tools(registry):
-    registry.register("update_memory", update_memory, "Appends important facts about the user to permanent memory (Vector DB). Arguments: info (str).", requires_context=False)
-    registry.register("read_memory", read_memory, "Retrieves relevant facts from memory using vector search. Arguments: query (str).", requires_context=False)
+    registry.register("update_memory", update_memory, "Appends important facts about the user to permanent memory (Vector DB). Arguments: info (str).", requires_context=False, keywords="запомни память факт", exec_class="fast")
+    registry.register("read_memory", read_memory, "Retrieves relevant facts from memory using vector search. Arguments: query (str).", requires_context=False, keywords="помнишь вспомни память", exec_class="fast")
 
 def update_memory(info, **kwargs):
     """Appends important facts about the user to permanent memory."""
@@ -4,9 +4,9 @@ import os
 PROFILE_FILE = "data/profiles.json"
 
 def register_tools(registry):
-    registry.register("set_profile_info", set_profile_info, "Saves user profile information. Arguments: key (str), value (str).", requires_context=True)
-    registry.register("get_profile_info", get_profile_info, "Gets user profile information. Arguments: key (str).", requires_context=True)
-    registry.register("get_full_profile", get_full_profile, "Gets the full user profile.", requires_context=True)
+    registry.register("set_profile_info", set_profile_info, "Saves user profile information. Arguments: key (str), value (str).", requires_context=True, keywords="профиль запомни меня", exec_class="fast")
+    registry.register("get_profile_info", get_profile_info, "Gets user profile information. Arguments: key (str).", requires_context=True, keywords="профиль", exec_class="fast")
+    registry.register("get_full_profile", get_full_profile, "Gets the full user profile.", requires_context=True, keywords="профиль", exec_class="fast")
 
 def load_profiles():
     if os.path.exists(PROFILE_FILE):
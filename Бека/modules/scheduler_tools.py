@@ -1,6 +1,6 @@
 def register_tools(registry):
-    registry.register("set_reminder", set_reminder, "Sets a one-time reminder. Arguments: seconds (int), message (str).", requires_context=True)
-    registry.register("schedule_recurring_task", schedule_recurring_task, "Schedules a recurring task (e.g. daily weather). Arguments: time (str, 'HH:MM'), prompt (str).", requires_context=True)
+    registry.register("set_reminder", set_reminder, "Sets a one-time reminder. Arguments: seconds (int), message (str).", requires_context=True, keywords="напомни напоминание таймер через")
+    registry.register("schedule_recurring_task", schedule_recurring_task, "Schedules a recurring task (e.g. daily weather). Arguments: time (str, 'HH:MM'), prompt (str).", requires_context=True, keywords="каждый день ежедневно регулярно")
 
 async def alarm(context):
     """Callback function for the alarm job."""
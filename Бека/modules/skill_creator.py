@@ -2,8 +2,8 @@ import os
 import sys
 
 def register_tools(registry):
-    registry.register("create_new_skill", create_new_skill, "Creates a new skill/tool by writing Python code to a file. Arguments: filename (str, e.g., 'my_tool.py'), code (str).")
-    registry.register("reload_all_skills", reload_all_skills, "Reloads all skills from the modules directory.", requires_context=True)
+    registry.register("create_new_skill", create_new_skill, "Creates a new skill/tool by writing Python code to a file. Arguments: filename (str, e.g., 'my_tool.py'), code (str).", keywords="навык скилл создай инструмент", exec_class="fast")
+    registry.register("reload_all_skills", reload_all_skills, "Reloads all skills from the modules directory.", requires_context=True, keywords="навыки перезагрузи")
 
 def create_new_skill(filename, code):
     """Writes a new Python file to the modules directory."""
@@ -2,10 +2,10 @@ import subprocess
 import os
 
 def register_tools(registry):
-    registry.register("execute_command", execute_command, "Executes a shell command. Arguments: command (str), timeout (int, optional).")
-    registry.register("read_file", read_file, "Reads content of a file. Arguments: filepath (str).")
-    registry.register("write_file", write_file, "Writes content to a file. Arguments: filepath (str), content (str).")
-    registry.register("list_files", list_files, "Lists files in a directory. Arguments: directory (str, optional).")
+    registry.register("execute_command", execute_command, "Executes a shell command. Arguments: command (str), timeout (int, optional).", keywords="команда терминал shell консоль", exec_class="subprocess")
+    registry.register("read_file", read_file, "Reads content of a file. Arguments: filepath (str).", keywords="файл прочитай открой", exec_class="fast")
+    registry.register("write_file", write_file, "Writes content to a file. Arguments: filepath (str), content (str).", keywords="файл запиши сохрани", exec_class="fast")
+    registry.register("list_files", list_files, "Lists files in a directory. Arguments: directory (str, optional).", keywords="файлы папка директория список", exec_class="fast")
 
 def execute_command(command, timeout=30):
     """Executes a shell command."""
@@ -8,7 +8,10 @@ def register_tools(registry):
         tavily_deep_research,
         "Uses Tavily API to autonomously research the web, gather context from multiple sites, "
         "and return a highly accurate synthesized answer with source URLs. Use this for complex "
-        "questions, deep research, or when you need a ready-made summarized answer. Arguments: query (str)."
+        "questions, deep research, or when you need a ready-made summarized answer. Arguments: query (str).",
+        cache_ttl=1800,
+        cache_persist=True,
+        keywords="поиск найди интернет новости узнай исследуй",
     )
 
 def tavily_deep_research(query):
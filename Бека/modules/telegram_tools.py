@@ -1,8 +1,8 @@
 import os
 
 def register_tools(registry):
-    registry.register("send_file", send_file, "Sends a file to the user. Arguments: filepath (str). Context (bot, chat_id) is injected automatically.", requires_context=True)
-    registry.register("send_message", send_message, "Sends a separate message to the user. Arguments: text (str). Context (bot, chat_id) is injected automatically.", requires_context=True)
+    registry.register("send_file", send_file, "Sends a file to the user. Arguments: filepath (str). Context (bot, chat_id) is injected automatically.", requires_context=True, keywords="отправь пришли файл документ")
+    registry.register("send_message", send_message, "Sends a separate message to the user. Arguments: text (str). Context (bot, chat_id) is injected automatically.", requires_context=True, keywords="отправь сообщение напиши")
 
 async def send_file(filepath, bot=None, chat_id=None, **kwargs):
     """Sends a file to the user via Telegram."""
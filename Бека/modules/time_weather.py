@@ -2,8 +2,8 @@ import datetime
 import requests
 
 def register_tools(registry):
-    registry.register("get_current_time", get_current_time, "Returns the current date and time.")
-    registry.register("get_weather", get_weather, "Gets the current weather for a city. Arguments: city (str).")
+    registry.register("get_current_time", get_current_time, "Returns the current date and time.", keywords="время дата сегодня который час", exec_class="fast")
+    registry.register("get_weather", get_weather, "Gets the current weather for a city. Arguments: city (str).", cache_ttl=600, keywords="погода температура прогноз")
 
 def get_current_time():
     """Returns the current date and time in a human-readable format."""
@@ -3,7 +3,7 @@ from bs4 import BeautifulSoup
 import config
 
 def register_tools(registry):
-    registry.register("visit_page", visit_page, "Visits a webpage and extracts text. Arguments: url (str).")
+    registry.register("visit_page", visit_page, "Visits a webpage and extracts text. Arguments: url (str).", cache_ttl=300, keywords="сайт страница ссылка открой прочитай", exec_class="io")
 
 def visit_page(url):
     """Visits a webpage and extracts text."""
@@ -267,6 +267,7 @@ def register_tools(registry):
         "xatab_search",
         search_games,
         "Поиск игр на xatab. Аргумент: query (название игры для поиска).",
+        cache_ttl=900,
     )
     registry.register(
         "xatab_game_details",
@@ -0,0 +1,76 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip("openai")
+
+from core.agent import Agent
+from core.coalescer import InputCoalescer
+from core.tools import ToolRegistry
+
+
+def make_agent(requests, calls=None):
+    agent = Agent(ToolRegistry(), system_prompt="You are a test assistant.")
+    agent.prefetcher = None
+    calls = calls if calls is not None else []
+
+    async def generate(messages, **kwargs):
+        requests.append([dict(m) for m in messages])
+        calls.append(kwargs)
+
+        async def stream():
+            delta = SimpleNamespace(content="A corgi.", tool_calls=None)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+        return stream()
+
+    agent.llm.generate = generate
+    return agent
+
+
+async def drain(agent, prompt, history):
+    async for _ in agent.run(prompt, history=history):
+        pass
+
+
+def test_text_then_photo_reaches_the_model():
+    requests = []
+    agent = make_agent(requests)
+    # handle_photo logs the upload to history before the burst is flushed
+    note = {"role": "user", "content": "[Image uploaded to downloads/1/image.jpg]. Caption: "}
+    history = [{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello!"}, note]
+    flushed = []
+
+    async def burst():
+        coalescer = InputCoalescer(lambda chat_id, prompt, context: flushed.append(prompt), window=0.01)
+        coalescer.add("1", "What breed is this dog?", None)
+        coalescer.add("1", "Analyze this image.", None, kind="image", explicit=False)
+        await asyncio.sleep(0.05)
+        await drain(agent, flushed[0], history)
+
+    asyncio.run(burst())
+
+    sent = requests[0]
+    user_messages = [m["content"] for m in sent if m["role"] == "user"]
+    assert user_messages[-2] == note["content"]
+    assert "What breed is this dog?" in user_messages[-1]
+    assert "Analyze this image." in user_messages[-1]
+
+
+def test_prompt_already_in_history_is_not_repeated():
+    requests = []
+    agent = make_agent(requests)
+    history = [{"role": "user", "content": "What time is it?", "_tokens": 9}]
+
+    asyncio.run(drain(agent, "What time is it?", history))
+
+    assert [m["role"] for m in requests[0]] == ["system", "user"]
+
+
+def test_tool_token_count_is_passed_to_the_llm():
+    requests, calls = [], []
+    agent = make_agent(requests, calls)
+
+    asyncio.run(drain(agent, "Hello", []))
+
+    # The scheduler's estimate reuses the count instead of serializing the definitions again
+    assert isinstance(calls[0]["tools_tokens"], int)
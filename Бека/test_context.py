@@ -0,0 +1,140 @@
+from core.context import ContextAssembler, SUMMARY_PREFIX
+from core.observations import ObservationStore
+from core.tokens import count_tokens, history_tokens
+
+SYSTEM = "You are a helpful assistant."
+
+
+def words(prefix, n):
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+
+def conversation(turns, size=60):
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "content": words(f"question{i}x", size)})
+        history.append({"role": "assistant", "content": words(f"answer{i}x", size)})
+    return history
+
+
+def run_with_observations(*texts):
+    """The current user message, one assistant call per text and its tool result."""
+    run = [{"role": "user", "content": "Summarize the reports"}]
+    for i, text in enumerate(texts):
+        run.append({
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [{"id": f"call{i}", "type": "function", "function": {"name": "report", "arguments": "{}"}}],
+        })
+        run.append({"role": "tool", "tool_call_id": f"call{i}", "name": "report", "content": text})
+    return run
+
+
+def test_everything_fits_unchanged():
+    history = conversation(2) + run_with_observations("short result")
+    context_at = len(history) - 2
+    assembler = ContextAssembler(budget=10_000)
+
+    view, block, view_context_at, report = assembler.assemble(
+        SYSTEM, history, "[Context]\nNow: today", context_at
+    )
+
+    assert view == history
+    assert block == "[Context]\nNow: today"
+    assert view_context_at == context_at
+    assert report["dropped_messages"] == 0
+    assert report["squeezed"] == 0
+    assert report["used"] <= report["budget"]
+
+
+def test_report_sections_add_up():
+    history = conversation(3) + run_with_observations("result " * 50)
+    assembler = ContextAssembler(budget=10_000)
+
+    _, _, _, report = assembler.assemble(SYSTEM, history, "", len(history) - 2, tools_tokens=120)
+
+    sections = ("system", "tools", "current", "summary", "recent", "memory", "observations")
+    assert report["used"] == sum(report[key] for key in sections)
+    assert report["tools"] == 120
+    assert report["system"] == count_tokens(SYSTEM) + 4
+
+
+def test_older_turns_are_dropped_at_a_user_boundary():
+    earlier = conversation(12)
+    current = [{"role": "user", "content": "And now?"}]
+    history = earlier + current
+    assembler = ContextAssembler(budget=history_tokens(earlier) // 3)
+
+    view, _, view_context_at, report = assembler.assemble(SYSTEM, history, "", len(history))
+
+    assert report["dropped_messages"] > 0
+    assert view[0]["role"] == "user"
+    assert view[-1] is current[0]
+    assert view == history[report["dropped_messages"]:]
+    assert view_context_at == len(view)
+    assert report["recent"] <= assembler.budget * assembler.shares["recent"]
+    assert report["used"] <= report["budget"]
+    assert assembler.get_stats()["dropped_messages"] == report["dropped_messages"]
+
+
+def test_newest_summaries_are_kept():
+    summaries = [
+        {"role": "system", "content": f"{SUMMARY_PREFIX}\n{words(f'summary{i}x', 80)}"} for i in range(3)
+    ]
+    current = [{"role": "user", "content": "Hi"}]
+    history = summaries + current
+    budget = history_tokens(summaries[-1:]) * 12
+    assembler = ContextAssembler(budget=budget, shares={"summary": history_tokens(summaries[-1:]) * 1.5 / budget})
+
+    view, _, _, report = assembler.assemble(SYSTEM, history, "", len(history))
+
+    assert view == [summaries[-1], current[0]]
+    assert report["dropped_messages"] == 2
+
+
+def test_oldest_observations_are_squeezed_first(tmp_path):
+    old_text = words("old", 400)
+    new_text = words("new", 400)
+    history = run_with_observations(old_text, new_text)
+    store = ObservationStore(spill_dir=str(tmp_path))
+    budget = count_tokens(SYSTEM) + history_tokens(history) - history_tokens(history[2:3]) // 2
+    assembler = ContextAssembler(budget=budget)
+
+    view, _, _, report = assembler.assemble(SYSTEM, history, "", 1, store=store)
+
+    old, new = view[2], view[4]
+    assert report["squeezed"] == 1
+    assert old["_squeezed"] is True
+    assert "squeezed to fit the context budget" in old["content"]
+    assert len(old["content"]) < len(old_text)
+    assert new["content"] == new_text
+    # The full text is still readable through the store
+    assert 'stored as "obs-1"' in old["content"]
+    assert old_text[:100] in store.read("obs-1", 0, 100)
+
+
+def test_squeezing_keeps_the_prefix_stable(tmp_path):
+    history = run_with_observations(words("old", 400), words("new", 400))
+    store = ObservationStore(spill_dir=str(tmp_path))
+    budget = count_tokens(SYSTEM) + history_tokens(history) - history_tokens(history[2:3]) // 2
+    assembler = ContextAssembler(budget=budget)
+
+    first, _, _, _ = assembler.assemble(SYSTEM, history, "", 1, store=store)
+    first = [dict(m) for m in first]
+    second, _, _, report = assembler.assemble(SYSTEM, history, "", 1, store=store)
+
+    # Squeezing edited the run's history, so the next request starts the same way
+    assert report["squeezed"] == 0
+    assert [dict(m) for m in second] == first
+
+
+def test_memory_lines_are_dropped_from_the_end():
+    block = "[Context]\nNow: today\nMemory:\n" + "\n".join(f"- {words(f'fact{i}x', 30)}" for i in range(5))
+    limit = count_tokens(block) // 2
+
+    fitted = ContextAssembler._fit_block(block, limit)
+
+    assert fitted.startswith("[Context]\nNow: today\nMemory:\n- fact0x0")
+    assert count_tokens(fitted) + 4 <= limit
+    assert "fact4x0" not in fitted
+    assert ContextAssembler._fit_block(block, 1) == ""
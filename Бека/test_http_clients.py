@@ -0,0 +1,64 @@
+import threading
+import pytest
+import config
+
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("openai")
+
+from core.http_clients import ClientPool
+
+
+def build_with_timeout(factory, timeout=5):
+    """Runs factory() in a thread so a deadlock fails the test instead of hanging it."""
+    result = {}
+
+    def target():
+        try:
+            result["client"] = factory()
+        except Exception as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "client creation deadlocked"
+    if "error" in result:
+        raise result["error"]
+    return result["client"]
+
+
+@pytest.fixture(autouse=True)
+def api_keys(monkeypatch):
+    for name in ("DEEPSEEK_API_KEY", "GROQ_API_KEY"):
+        monkeypatch.setattr(config, name, "test-key", raising=False)
+
+
+@pytest.mark.parametrize("kind", ["async_http", "sync_http", "async_openai", "openai"])
+@pytest.mark.parametrize("provider", ["deepseek", "groq"])
+def test_builds_every_client_kind_once(kind, provider):
+    pool = ClientPool()
+    client = build_with_timeout(lambda: getattr(pool, kind)(provider))
+    assert build_with_timeout(lambda: getattr(pool, kind)(provider)) is client
+
+
+def test_sdk_clients_share_the_pooled_http_client():
+    pool = ClientPool()
+    http = build_with_timeout(lambda: pool.sync_http("groq"))
+    sdk = build_with_timeout(lambda: pool.openai("groq"))
+    assert sdk._client is http
+    assert str(sdk.base_url).startswith(pool.base_url("groq"))
+
+
+def test_groq_sdk_client():
+    pytest.importorskip("groq")
+    pool = ClientPool()
+    client = build_with_timeout(pool.groq)
+    assert build_with_timeout(pool.groq) is client
+
+
+def test_stats_cover_built_providers():
+    pool = ClientPool()
+    build_with_timeout(lambda: pool.async_openai("deepseek"))
+    stats = pool.get_stats()
+    assert set(stats) == {"deepseek"}
+    assert stats["deepseek"]["requests"] == 0
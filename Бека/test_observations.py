@@ -0,0 +1,81 @@
+import os
+from core.observations import ObservationReducer, ObservationStore
+
+TEXT = "".join(f"line {i:04d}\n" for i in range(1000))  # 10 chars per line
+
+
+def test_read_pages_through_a_result(tmp_path):
+    store = ObservationStore(spill_dir=str(tmp_path), page_chars=100)
+    handle = store.put("web_search", TEXT)
+
+    first = store.read(handle)
+    assert first == f"[{handle}: characters 0-100 of {len(TEXT)}; next offset 100]\n{TEXT[:100]}"
+
+    second = store.read(handle, offset=100, length=50)
+    assert second.endswith(TEXT[100:150])
+    assert "next offset 150" in second
+
+    last = store.read(handle, offset=len(TEXT) - 30)
+    assert last.endswith(TEXT[-30:])
+    assert "; end]" in last
+    assert store.stats["reads"] == 3
+    assert store.stats["chars_read"] == 180
+
+
+def test_page_length_is_capped(tmp_path):
+    store = ObservationStore(spill_dir=str(tmp_path), page_chars=100)
+    handle = store.put("web_search", TEXT)
+
+    page = store.read(handle, length=10_000)
+
+    assert page.split("\n", 1)[1] == TEXT[:400]
+
+
+def test_handles_are_described_and_validated(tmp_path):
+    store = ObservationStore(spill_dir=str(tmp_path))
+    handle = store.put("web_search", TEXT)
+
+    assert handle == "obs-1"
+    assert f'stored as "{handle}"' in store.describe(handle)
+    assert store.read("obs-9").startswith("Error: Unknown observation handle 'obs-9'. Available: obs-1")
+    assert store.read(handle, offset="x").startswith("Error:")
+
+
+def test_oldest_results_spill_to_disk(tmp_path):
+    store = ObservationStore(memory_chars=len(TEXT) + 10, spill_dir=str(tmp_path), page_chars=100)
+    first = store.put("a", TEXT)
+    second = store.put("b", TEXT.upper())
+
+    spilled = os.listdir(tmp_path)
+    assert store.stats["spilled"] == 1
+    assert spilled == [f"{store.run_id}-{first}.txt"]
+    # Paging works the same from disk and from memory
+    assert store.read(first, offset=500, length=20).endswith(TEXT[500:520])
+    assert store.read(second, offset=500, length=20).endswith(TEXT.upper()[500:520])
+
+    store.close()
+    assert os.listdir(tmp_path) == []
+    assert store.read(first).startswith("Error: Unknown observation handle")
+
+
+def test_reducer_keeps_small_results():
+    reducer = ObservationReducer(budget=1000)
+
+    assert reducer.reduce("short result", "query") == "short result"
+    assert reducer.get_stats()["reduced"] == 0
+
+
+def test_reducer_keeps_the_relevant_parts():
+    paragraphs = [f"Paragraph {i} has nothing of interest. " * 5 for i in range(40)]
+    paragraphs[37] = "The volcano erupted in the morning. " * 5
+    text = "\n\n".join(paragraphs)
+    reducer = ObservationReducer(budget=200, chunk_chars=300)
+
+    reduced = reducer.reduce(text, "when did the volcano erupt")
+
+    assert reduced.startswith("[Showing ")
+    assert paragraphs[37] in reduced
+    assert paragraphs[0] in reduced  # The lead chunk gets a bonus
+    assert paragraphs[20] not in reduced
+    assert "[...]" in reduced
+    assert reducer.get_stats()["tokens_saved"] > 0
@@ -0,0 +1,28 @@
+import asyncio
+from types import SimpleNamespace
+from core.router import LLMRouter
+
+
+class FakeCompletions:
+    async def create(self, model, stream, **kwargs):
+        await asyncio.sleep(0.01)
+        message = SimpleNamespace(content="done")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+def test_complete_leaves_the_ttft_window_alone():
+    client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()))
+    router = LLMRouter(lambda provider: client)
+    router.hedge_delay = None
+
+    async def main():
+        for _ in range(router.hedge_min_samples + 5):
+            message, _ = await router.complete("deepseek", "deepseek-chat", messages=[])
+            assert message.content == "done"
+
+    asyncio.run(main())
+
+    health = router.health["deepseek:deepseek-chat"]
+    assert health.counts["wins"] == router.hedge_min_samples + 5
+    assert len(health.ttfts) == 0
+    assert router._hedge_delay("deepseek:deepseek-chat") is None
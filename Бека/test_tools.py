@@ -0,0 +1,51 @@
+import asyncio
+from core.tools import ToolRegistry
+
+
+def make_registry(func):
+    registry = ToolRegistry()
+    registry.allowed_users = ["1"]
+    registry.register("secret", func, "Returns a secret.", cache_ttl=60)
+    return registry
+
+
+def test_unauthorized_chat_misses_a_filled_cache():
+    calls = []
+
+    def secret(name):
+        calls.append(name)
+        return f"SECRET {name}"
+
+    registry = make_registry(secret)
+
+    async def main():
+        owner = await registry.execute_async("secret", tool_context={"chat_id": 1}, name="a")
+        stranger = await registry.execute_async("secret", tool_context={"chat_id": 999}, name="a")
+        return owner, stranger
+
+    owner, stranger = asyncio.run(main())
+
+    assert owner == "SECRET a"
+    assert stranger == "Error: User 999 is not authorized to use tools."
+    assert calls == ["a"]
+    assert registry.cache_stats()["hits"] == 0
+
+
+def test_unauthorized_chat_cannot_join_a_call_in_flight():
+    async def secret(name):
+        await asyncio.sleep(0.05)
+        return f"SECRET {name}"
+
+    registry = make_registry(secret)
+
+    async def main():
+        return await asyncio.gather(
+            registry.execute_async("secret", tool_context={"chat_id": 1}, name="a"),
+            registry.execute_async("secret", tool_context={"chat_id": 999}, name="a"),
+        )
+
+    owner, stranger = asyncio.run(main())
+
+    assert owner == "SECRET a"
+    assert stranger.startswith("Error: User 999 is not authorized")
+    assert registry.cache_stats()["coalesced"] == 0